@@ -0,0 +1,91 @@
+"""Throughput of TextPreprocessor with the bounded fuzzy-duplicate check against the original
+SequenceMatcher-only loop, checking that both produce the same text.
+
+Uso:
+    python -m benchmark_ED.preprocess_benchmark --path data/uploads
+    python -m benchmark_ED.preprocess_benchmark --synthetic --pages 2000
+    python -m benchmark_ED.preprocess_benchmark --path data/uploads --header-footer --exact-scope page
+"""
+import argparse
+import glob
+import os
+import random
+import time
+
+from rag_system.utils.preprocess import TextPreprocessor
+
+
+def load_corpus(path):
+    import pymupdf
+
+    corpus = {}
+    for file_path in sorted(glob.glob(os.path.join(path, "**", "*"), recursive=True)):
+        if file_path.lower().endswith(".pdf"):
+            with pymupdf.open(file_path) as doc:
+                corpus[file_path] = [page.get_text() for page in doc]
+        elif file_path.lower().endswith(".txt"):
+            with open(file_path, "r", encoding="utf8") as f:
+                corpus[file_path] = f.read().split("\f")
+    return corpus
+
+
+def synthetic_corpus(n_pages, seed=42):
+    # Scanned-thesis shape: running header and footer per page, long OCR lines with near-duplicates.
+    rng = random.Random(seed)
+    words = "modelo dados resultado rede treinamento análise método proposto avaliação tabela figura".split()
+    pages = []
+    for page_number in range(1, n_pages + 1):
+        lines = ["UNIVERSIDADE FEDERAL DE VIÇOSA - PROGRAMA DE PÓS-GRADUAÇÃO", "Capítulo 3. Metodologia"]
+        for _ in range(40):
+            line = " ".join(rng.choice(words) for _ in range(rng.randint(3, 30)))
+            lines.append(line)
+            if rng.random() < 0.1:
+                lines.append(line[:-2] + "..")
+        lines += ["", f"Página {page_number}"]
+        pages.append("\n".join(lines))
+    return {"synthetic": pages}
+
+
+def timed(preprocessor, corpus):
+    started = time.perf_counter()
+    outputs = {name: preprocessor.run("\n".join(pages)) for name, pages in corpus.items()}
+    return outputs, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default="data/uploads")
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--header-footer", action="store_true", help="also time run_pages with header/footer removal")
+    parser.add_argument("--exact-scope", default="document", choices=["document", "page"])
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.pages) if args.synthetic else load_corpus(args.path)
+    n_lines = sum(page.count("\n") + 1 for pages in corpus.values() for page in pages)
+    print(f"{len(corpus)} documentos, {n_lines:,} linhas")
+
+    reference, slow_time = timed(TextPreprocessor(fast_fuzzy=False), corpus)
+    fast, fast_time = timed(TextPreprocessor(fast_fuzzy=True), corpus)
+    different = [name for name in corpus if reference[name] != fast[name]]
+
+    print(f"{'modo':>22} {'linhas/s':>12} {'tempo_s':>9}")
+    print(f"{'SequenceMatcher':>22} {n_lines / slow_time:>12,.0f} {slow_time:>9.2f}")
+    print(f"{'limites + ratio':>22} {n_lines / fast_time:>12,.0f} {fast_time:>9.2f}")
+    print(f"Saídas idênticas: {len(corpus) - len(different)}/{len(corpus)}")
+    for name in different:
+        print(f"  diferente: {name}")
+
+    if args.header_footer or args.exact_scope == "page":
+        preprocessor = TextPreprocessor(header_footer=args.header_footer, exact_scope=args.exact_scope)
+        started = time.perf_counter()
+        paged = {name: preprocessor.run_pages(pages) for name, pages in corpus.items()}
+        elapsed = time.perf_counter() - started
+        kept = sum(text.count("\n") + 1 for text in paged.values())
+        baseline = sum(text.count("\n") + 1 for text in fast.values())
+        print(f"{'por página':>22} {n_lines / elapsed:>12,.0f} {elapsed:>9.2f}  "
+              f"({kept:,} linhas mantidas contra {baseline:,})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Recall/memory benchmark for the quantized and Matryoshka-prefix first passes of the exact vector backend.
+
+Uso:
+    python -m benchmark_ED.quantization_benchmark --path benchmark_ED/notebooks/wikipedia_pt/data --n 200000
+    python -m benchmark_ED.quantization_benchmark --synthetic --n 100000 --dim 768
+    python -m benchmark_ED.quantization_benchmark --n 200000 --prefix-dims 64 128 256 --shortlists 100 500
+"""
+import argparse
+import glob
+import time
+
+import numpy as np
+
+from rag_system.VectorDB.local_store import blocked_topk, exact_search, normalize_rows, rescore
+from rag_system.VectorDB.quantization import ProductQuantizer, ScalarQuantizer
+
+
+def load_embeddings(path, N):
+    import pyarrow.parquet as pq
+
+    batches, total = [], 0
+    for shard_file in sorted(glob.glob(f"{path}/*.parquet")):
+        table = pq.read_table(shard_file, columns=["embeddings"])
+        batch = np.asarray(table["embeddings"].to_pylist(), dtype=np.float32)
+        batches.append(batch[:N - total])
+        total += len(batches[-1])
+        if total >= N:
+            break
+    return np.concatenate(batches)
+
+
+def synthetic_embeddings(N, dim, n_clusters=256, seed=42):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, N)
+    return centers[labels] + 0.5 * rng.normal(size=(N, dim)).astype(np.float32)
+
+
+def recall(found, truth):
+    return np.mean([len(set(f.tolist()) & set(t.tolist())) / len(t) for f, t in zip(found, truth)])
+
+
+def benchmark_quantizer(name, quantizer, vectors, queries, truth, k, rescore_factors, train_size):
+    sample = np.random.default_rng(0).choice(len(vectors), min(train_size, len(vectors)), replace=False)
+
+    t0 = time.time()
+    quantizer.train(vectors[np.sort(sample)])
+    codes = np.concatenate([quantizer.encode(vectors[i:i + 65536]) for i in range(0, len(vectors), 65536)])
+    build_time = time.time() - t0
+
+    rows = []
+    for factor in rescore_factors:
+        t0 = time.time()
+        candidates = blocked_topk(codes, queries, k * factor, score=quantizer.scorer(queries))
+        hits = rescore(vectors, queries, candidates, k) if factor > 1 else candidates
+        query_time = (time.time() - t0) / len(queries)
+
+        rows.append({
+            "metodo": name,
+            "rescore_factor": factor,
+            "recall": recall([h[0] for h in hits], truth),
+            "tempo_busca_ms": query_time * 1000,
+            "bytes_indice": codes.nbytes,
+            "compressao": vectors.nbytes / codes.nbytes,
+            "tempo_construcao_s": build_time,
+        })
+    return rows
+
+
+def benchmark_prefix(prefix_dims, vectors, queries, truth, k, shortlists):
+    t0 = time.time()
+    prefix = normalize_rows(vectors[:, :prefix_dims])
+    build_time = time.time() - t0
+    prefix_queries = normalize_rows(queries[:, :prefix_dims])
+
+    rows = []
+    for shortlist in shortlists:
+        t0 = time.time()
+        candidates = blocked_topk(prefix, prefix_queries, max(shortlist, k))
+        hits = rescore(vectors, queries, candidates, k)
+        query_time = (time.time() - t0) / len(queries)
+
+        rows.append({
+            "metodo": f"mrl-{prefix_dims}",
+            "rescore_factor": shortlist,
+            "recall": recall([h[0] for h in hits], truth),
+            "tempo_busca_ms": query_time * 1000,
+            "bytes_indice": prefix.nbytes,
+            "compressao": vectors.nbytes / prefix.nbytes,
+            "tempo_construcao_s": build_time,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default="benchmark_ED/notebooks/wikipedia_pt/data")
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--train-size", type=int, default=20_000)
+    parser.add_argument("--pq-subspaces", type=int, nargs="+", default=[0])
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[1, 4, 10])
+    parser.add_argument("--prefix-dims", type=int, nargs="*", default=[])
+    parser.add_argument("--shortlists", type=int, nargs="+", default=[100, 500])
+    args = parser.parse_args()
+
+    print("Carregando embeddings...")
+    t0 = time.time()
+    raw = synthetic_embeddings(args.n, args.dim) if args.synthetic else load_embeddings(args.path, args.n)
+    vectors = normalize_rows(raw)
+    print(f"{len(vectors):,} embeddings de dimensao {vectors.shape[1]} em {time.time() - t0:.2f} s")
+
+    rng = np.random.default_rng(1)
+    queries = normalize_rows(vectors[rng.choice(len(vectors), args.queries, replace=False)]
+                             + 0.05 * rng.normal(size=(args.queries, vectors.shape[1])).astype(np.float32))
+
+    t0 = time.time()
+    truth = [rows for rows, _ in exact_search(vectors, queries, args.k)]
+    exact_time = (time.time() - t0) / len(queries)
+    print(f"Exato float32: {vectors.nbytes / 2**20:.1f} MiB, {exact_time * 1000:.2f} ms/consulta")
+
+    quantizers = [("int8", ScalarQuantizer())]
+    for m in args.pq_subspaces:
+        quantizers.append((f"pq-{m or vectors.shape[1] // 4}", ProductQuantizer(n_subspaces=m or None)))
+
+    # "rescore" is the rescore factor for quantizers and the shortlist size for prefixes.
+    print(f"\n{'metodo':>10} {'rescore':>8} {'recall@' + str(args.k):>10} {'ms/consulta':>12} {'MiB':>8} {'compressao':>11}")
+    results = []
+    for name, quantizer in quantizers:
+        results += benchmark_quantizer(name, quantizer, vectors, queries, truth, args.k,
+                                       args.rescore_factors, args.train_size)
+    for prefix_dims in args.prefix_dims:
+        results += benchmark_prefix(prefix_dims, vectors, queries, truth, args.k, args.shortlists)
+
+    for row in results:
+        print(f"{row['metodo']:>10} {row['rescore_factor']:>8} {row['recall']:>10.3f} "
+              f"{row['tempo_busca_ms']:>12.2f} {row['bytes_indice'] / 2**20:>8.1f} {row['compressao']:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
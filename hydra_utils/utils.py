@@ -1,12 +1,25 @@
 import importlib
+import re
 from omegaconf import OmegaConf, DictConfig, ListConfig
 
+_NODE_REFERENCE = re.compile(r"^\$\{([A-Za-z_][\w\-]*(?:\.[\w\-]+)*)\}$")
+
 def import_class(path: str):
     module_name, class_name = path.rsplit(".", 1)
     module = importlib.import_module(module_name)
     return getattr(module, class_name)
 
-def instantiate_tree(cfg):
+def instantiate_tree(cfg, shared: bool = False, lazy: bool = False):
+    # shared: every `${node}` reference points to the same built object.
+    # lazy: nodes are only built the first time they are requested via get().
+    if shared or lazy:
+        if not isinstance(cfg, (DictConfig, ListConfig)):
+            cfg = OmegaConf.create(cfg)
+        graph = InstanceGraph(cfg)
+        if lazy:
+            return graph
+        return graph.build_all()
+
     if isinstance(cfg, DictConfig) or isinstance(cfg, dict):
         cfg = OmegaConf.to_container(cfg, resolve=True)
 
@@ -31,3 +44,97 @@ def _instantiate(cfg):
 
     else:
         return cfg
+
+
+class InstanceGraph:
+    # Memoizes every `_target_` node by its dotted config path.
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self._raw = OmegaConf.to_container(cfg, resolve=False)
+        self._built = {}
+        self._building = []
+
+    def __contains__(self, key):
+        return isinstance(self._raw, dict) and key in self._raw
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return self.build(key)
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        return self.build(key)
+
+    def keys(self):
+        return list(self._raw.keys()) if isinstance(self._raw, dict) else []
+
+    def built_keys(self):
+        return [key for key in self.keys() if key in self._built]
+
+    def build_all(self):
+        return {key: self.build(key) for key in self.keys()}
+
+    def build(self, path: str):
+        if path in self._built:
+            return self._built[path]
+
+        if path in self._building:
+            chain = " -> ".join(self._building + [path])
+            raise ValueError(f"Circular reference in config: {chain}")
+
+        self._building.append(path)
+        try:
+            obj = self._instantiate(self._node(path), path)
+        finally:
+            self._building.pop()
+
+        self._built[path] = obj
+        return obj
+
+    def _node(self, path: str):
+        node = self._raw
+        for part in path.split("."):
+            if isinstance(node, list):
+                node = node[int(part)]
+            elif isinstance(node, dict) and part in node:
+                node = node[part]
+            else:
+                raise KeyError(f"Config node not found: {path}")
+        return node
+
+    def _instantiate(self, node, path: str):
+        if isinstance(node, str):
+            match = _NODE_REFERENCE.match(node)
+            if match:
+                return self.build(match.group(1))
+            if "${" in node:
+                # String interpolations and resolvers produce plain values.
+                return OmegaConf.select(self.cfg, path)
+            return node
+
+        if isinstance(node, dict):
+            if "_target_" in node and path not in self._building:
+                return self.build(path)
+
+            items = {
+                key: self._child(value, f"{path}.{key}")
+                for key, value in node.items()
+                if key != "_target_"
+            }
+            if "_target_" in node:
+                cls = import_class(node["_target_"])
+                return cls(**items)
+            return items
+
+        if isinstance(node, list):
+            return [self._child(item, f"{path}.{i}") for i, item in enumerate(node)]
+
+        return node
+
+    def _child(self, node, path: str):
+        if isinstance(node, dict) and "_target_" in node:
+            return self.build(path)
+        return self._instantiate(node, path)
@@ -11,6 +11,7 @@ from typing import List
 from pathlib import Path
 
 from hydra_utils.utils import instantiate_tree
+from rag_system.utils.batching import batcher_stats
 
 api = FastAPI(title="RAG + Ollama API")
 
@@ -31,7 +32,7 @@ from omegaconf import OmegaConf
 
 cfg_yaml = OmegaConf.load(config_path)
 
-instances = instantiate_tree(cfg_yaml)
+instances = instantiate_tree(cfg_yaml, shared=True, lazy=True)
 
 rag_pipeline = instances.get("rag_pipeline")
 
@@ -44,7 +45,7 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 @api.post("/ask_ollama3_with_rag_endpoint")
 async def ask_ollama3_with_rag_endpoint(request: PromptRequest):
 
-    final_prompt, retrievals = rag_pipeline.run(
+    final_prompt, retrievals = await rag_pipeline.arun(
         query_user=request.prompt,
         final_k=request.num_docs
     )
@@ -52,10 +53,19 @@ async def ask_ollama3_with_rag_endpoint(request: PromptRequest):
     print("final_prompt", final_prompt)
 
     generator = instances.get("generator")
+    cached_answer = retrievals.get("cached_answer")
 
-    def stream():
-        for token in generator.generate_stream(final_prompt):
+    async def stream():
+        if cached_answer:
+            for token in cached_answer:
+                yield token
+            return
+
+        tokens = []
+        async for token in generator.agenerate_stream(final_prompt):
+            tokens.append(token)
             yield token
+        rag_pipeline.remember_answer(retrievals, tokens)
 
     return StreamingResponse(stream(), media_type="text/plain")
 
@@ -94,62 +104,45 @@ async def upload_docs(files: List[UploadFile] = File(...)):
     }
 
 
-import hashlib
-
 @api.post("/process_docs")
 def process_docs():
 
-    vector_db = instances.get("vector_db")        
-    semantical_chunker = instances.get("semantical_chunker")
-
-    total_chunks = 0
-    processed_files = []
-
-    for filename in os.listdir(UPLOAD_DIR):
-        file_path = UPLOAD_DIR / filename
-
-        if not filename.lower().endswith(".pdf"):
-            continue
-
-        with open(file_path, "rb") as f:
-            file_hash = hashlib.md5(f.read()).hexdigest()
-
-        if filename.lower().endswith(".pdf"):
-            chunks, embeddings, metadata = semantical_chunker.run(str(file_path))
-            
-        ids = [
-            f"{filename}_{file_hash}_{i}"
-            for i in range(len(chunks))
-        ]
-
-        final_metadata = []
-        for meta in metadata:
-            merged = dict(meta) if isinstance(meta, dict) else {}
-            if "page" not in merged and "page_number" in merged:
-                merged["page"] = merged.get("page_number")
-            merged.update({
-                "source": filename,
-                "file_hash": file_hash
-            })
-            final_metadata.append(merged)
-
-        vector_db.add_embeddings(
-            ids=ids,
-            documents=chunks,
-            embeddings=embeddings,
-            metadatas=final_metadata
-        )
-
-        total_chunks += len(chunks)
-        processed_files.append(filename)
-
-    if total_chunks == 0:
+    ingestion_pipeline = instances.get("ingestion_pipeline")
+
+    pdf_paths = [
+        UPLOAD_DIR / filename
+        for filename in sorted(os.listdir(UPLOAD_DIR))
+        if filename.lower().endswith(".pdf")
+    ]
+
+    summary = ingestion_pipeline.run(pdf_paths)
+
+    if summary["total_chunks"] == 0:
         return {
-            "status": "Nenhum documento válido para processamento"
+            "status": "Nenhum documento novo ou alterado" if summary["skipped_files"] else "Nenhum documento válido para processamento",
+            "skipped_files": summary["skipped_files"],
+            "failed_files": summary["failed_files"]
         }
 
     return {
         "status": "Base vetorial atualizada com sucesso",
-        "processed_files": processed_files,
-        "total_chunks": total_chunks
-    }
\ No newline at end of file
+        "processed_files": summary["processed_files"],
+        "skipped_files": summary["skipped_files"],
+        "failed_files": summary["failed_files"],
+        "total_chunks": summary["total_chunks"],
+        "collapsed_chunks": summary["collapsed_chunks"],
+        "seconds": summary["seconds"]
+    }
+
+@api.get("/cache_stats")
+def cache_stats():
+    retrieval_system = instances.get("retrieval_system")
+    vector_db = instances.get("vector_db")
+
+    return {
+        "query_embeddings": vector_db.embedding_cache.stats(),
+        "semantic_answers": rag_pipeline.semantic_cache.stats() if rag_pipeline.semantic_cache else None,
+        "rerank": retrieval_system.rerank_cache_stats(),
+        "section_router": retrieval_system.section_router.stats(),
+        "batching": batcher_stats()
+    }
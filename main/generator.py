@@ -17,6 +17,7 @@ class Generator(abc.ABC):
 class OllamaGenerator(Generator):
     def __init__(self, model_name: str = "llama3"):
         super().__init__(model_name=model_name)
+        self._async_client = None
 
     def generate_stream(self, prompt: str, system_prompt: Optional[str] = None):
         for chunk in ollama.chat(
@@ -26,6 +27,17 @@ class OllamaGenerator(Generator):
         ):
             yield chunk["message"]["content"]
 
+    async def agenerate_stream(self, prompt: str, system_prompt: Optional[str] = None):
+        if self._async_client is None:
+            self._async_client = ollama.AsyncClient()
+
+        async for chunk in await self._async_client.chat(
+            model="llama3.1:8b",
+            messages=[{"role": "user", "content": prompt}],
+            stream=True
+        ):
+            yield chunk["message"]["content"]
+
     def generate(self, prompt: str, system_prompt: Optional[str] = None) -> str:
         return "".join(self.generate_stream(prompt))
 
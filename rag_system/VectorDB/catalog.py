@@ -0,0 +1,100 @@
+import json
+import os
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+CATALOG_FIELDS = ("pdf_name", "section", "author")
+
+
+class CollectionCatalog:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.version = 0
+        self.total = 0
+        self.counts: Dict[str, Counter] = {field: Counter() for field in CATALOG_FIELDS}
+        self.titles: Counter = Counter()
+        self.loaded = False
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def add(self, metadatas: Iterable[Optional[Dict]]):
+        self._apply(metadatas, 1)
+
+    def remove(self, metadatas: Iterable[Optional[Dict]]):
+        self._apply(metadatas, -1)
+
+    def _apply(self, metadatas, sign: int):
+        for meta in metadatas:
+            meta = meta or {}
+            self.total += sign
+            for field in CATALOG_FIELDS:
+                value = meta.get(field)
+                if value:
+                    self._bump_counter(self.counts[field], str(value), sign)
+            if meta.get("title"):
+                self._bump_counter(self.titles, str(meta["title"]), sign)
+        self.total = max(self.total, 0)
+
+    @staticmethod
+    def _bump_counter(counter: Counter, key: str, sign: int):
+        counter[key] += sign
+        if counter[key] <= 0:
+            del counter[key]
+
+    def bump_version(self):
+        self.version += 1
+
+    def reset(self):
+        self.total = 0
+        self.counts = {field: Counter() for field in CATALOG_FIELDS}
+        self.titles = Counter()
+
+    def count(self, field: Optional[str] = None, value=None) -> int:
+        if field is None:
+            return self.total
+        if field == "title":
+            return self.titles.get(str(value), 0)
+        if field not in self.counts:
+            return 0
+        return self.counts[field].get(str(value), 0)
+
+    def known(self, field: str) -> bool:
+        return field == "title" or field in self.counts
+
+    def values(self, field: str) -> List[str]:
+        if field == "title":
+            return sorted(self.titles)
+        return sorted(self.counts.get(field, {}))
+
+    @property
+    def known_titles(self) -> List[str]:
+        return self.values("title")
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": self.version,
+            "total": self.total,
+            "counts": {field: dict(counter) for field, counter in self.counts.items()},
+            "titles": dict(self.titles),
+        }
+
+    def load(self):
+        with open(self.path, "r", encoding="utf8") as f:
+            data = json.load(f)
+
+        self.version = data.get("version", 0)
+        self.total = data.get("total", 0)
+        for field in CATALOG_FIELDS:
+            self.counts[field] = Counter(data.get("counts", {}).get(field, {}))
+        self.titles = Counter(data.get("titles", {}))
+        self.loaded = True
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -1,18 +1,119 @@
+import os
+from contextlib import contextmanager
+
 import chromadb
 import torch
+import numpy as np
+from typing import Dict, List, Optional
+
+from hydra_utils.utils import import_class
+from rag_system.VectorDB.catalog import CollectionCatalog
+from rag_system.VectorDB.filters import build_where
+from rag_system.retrieval.bm25 import BM25Index
+from rag_system.utils.batching import shared_batcher
+from rag_system.utils.embedding_cache import EmbeddingCache
+
+
+LOCAL_BACKENDS = {
+    "hnsw": "rag_system.VectorDB.hnsw.HNSWCollection",
+    "exact": "rag_system.VectorDB.exact.ExactCollection",
+}
+
+
+def empty_query_results(n_queries: int) -> Dict:
+    return {
+        key: [[] for _ in range(n_queries)]
+        for key in ("ids", "documents", "metadatas", "distances")
+    }
+
 
 class VectorDB:
-    def __init__(self, persist_directory="chroma_db", collection_name="ufv_documents"):
-        self.client = chromadb.PersistentClient(path=persist_directory)
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}
+    def __init__(
+        self,
+        persist_directory="chroma_db",
+        collection_name="ufv_documents",
+        keyword_index: bool = True,
+        batch_max_size: Optional[int] = None,
+        batch_max_wait_ms: float = 5.0,
+        embedding_cache_dir: Optional[str] = None,
+        embedding_cache_size: int = 2048,
+        backend: str = "chroma",
+        backend_params: Optional[Dict] = None
+    ):
+        self.persist_directory = persist_directory
+        self.embedding_cache = EmbeddingCache(embedding_cache_dir, max_memory_items=embedding_cache_size)
+        self.batch_max_size = batch_max_size
+        self.batch_max_wait_ms = batch_max_wait_ms
+        self.backend = backend
+        self._deferred_saves = 0
+        self._keyword_index_dirty = False
+        self.collection = self._create_collection(backend, persist_directory, collection_name, backend_params or {})
+
+        self.catalog = CollectionCatalog(
+            os.path.join(persist_directory, f"{collection_name}_catalog.json")
         )
+        if self.catalog.total != self.collection.count():
+            self.rebuild_catalog()
+
+        self.keyword_index = None
+        if keyword_index:
+            self.keyword_index = BM25Index(
+                os.path.join(persist_directory, f"{collection_name}_bm25.pkl")
+            )
+            # synced_version lags the catalog when a bulk write never reached its final flush.
+            stale = self.keyword_index.synced_version not in (None, self.catalog.version)
+            if stale or len(self.keyword_index) != self.catalog.total:
+                self.rebuild_keyword_index()
+
+    def _create_collection(self, backend: str, persist_directory: str, collection_name: str, backend_params: Dict):
+        if backend == "chroma":
+            self.client = chromadb.PersistentClient(path=persist_directory)
+            return self.client.get_or_create_collection(
+                name=collection_name,
+                metadata={"hnsw:space": "cosine"}
+            )
+
+        if backend not in LOCAL_BACKENDS:
+            raise ValueError(f"Unknown vector backend '{backend}', expected one of: chroma, {', '.join(LOCAL_BACKENDS)}.")
+
+        collection_cls = import_class(LOCAL_BACKENDS[backend])
+        return collection_cls(os.path.join(persist_directory, f"{collection_name}_{backend}"), **backend_params)
+
+    def rebuild_catalog(self, page_size: int = 5000):
+        self.catalog.reset()
+
+        offset = 0
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            metadatas = page.get("metadatas") or []
+            if not metadatas:
+                break
+            self.catalog.add(metadatas)
+            offset += len(metadatas)
+
+        self.catalog.bump_version()
+        self.catalog.save()
+
+    def rebuild_keyword_index(self, page_size: int = 5000):
+        self.keyword_index = BM25Index(self.keyword_index.path)
+
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            self.keyword_index.add_many(ids, page.get("documents") or [""] * len(ids), page.get("metadatas"))
+            offset += len(ids)
+
+        self._save_keyword_index()
 
     def add_embeddings(self, ids, embeddings, metadatas, documents=None):
         if isinstance(embeddings, torch.Tensor):
             embeddings = embeddings.cpu().numpy().tolist()
 
+        existing = self.collection.get(ids=list(ids), include=["metadatas"])
+
         self.collection.upsert(
             ids=ids,
             documents=documents,
@@ -20,23 +121,116 @@ class VectorDB:
             metadatas=metadatas
         )
 
-    def query(self, query_embeddings, n_results=5):
+        self.catalog.remove(existing.get("metadatas") or [])
+        self.catalog.add(metadatas or [{} for _ in ids])
+        self.catalog.bump_version()
+        self.catalog.save()
+
+        if self.keyword_index is not None and documents is not None:
+            self.keyword_index.add_many(list(ids), list(documents), metadatas)
+            self._save_keyword_index()
+
+    def delete(self, ids=None, where: Optional[Dict] = None) -> int:
+        if not ids and not where:
+            return 0
+
+        if ids:
+            existing = self.collection.get(ids=list(ids), include=["metadatas"])
+        else:
+            existing = self.collection.get(where=build_where(where), include=["metadatas"])
+        found = existing.get("ids") or []
+        if not found:
+            return 0
+
+        self.collection.delete(ids=found)
+
+        self.catalog.remove(existing.get("metadatas") or [])
+        self.catalog.bump_version()
+        self.catalog.save()
+
+        if self.keyword_index is not None:
+            for doc_id in found:
+                self.keyword_index.remove(doc_id)
+            self._save_keyword_index()
+
+        return len(found)
+
+    def _save_keyword_index(self):
+        self._keyword_index_dirty = True
+        if not self._deferred_saves:
+            self.flush()
+
+    def flush(self):
+        # Persists a keyword index whose saves were deferred by bulk_writes().
+        if self.keyword_index is not None and self._keyword_index_dirty:
+            self.keyword_index.synced_version = self.catalog.version
+            self.keyword_index.save()
+        self._keyword_index_dirty = False
+
+    @contextmanager
+    def bulk_writes(self):
+        # Writers making many add_embeddings/delete calls (the ingestion pipeline) pickle the
+        # BM25 index once at the end instead of after every call.
+        self._deferred_saves += 1
+        try:
+            yield self
+        finally:
+            self._deferred_saves -= 1
+            if not self._deferred_saves:
+                self.flush()
+
+    def get(self, ids, include=("documents", "metadatas")):
+        if not ids:
+            return {"ids": [], "documents": [], "metadatas": []}
+        return self.collection.get(ids=list(ids), include=list(include))
+
+    def keyword_search(self, query: str, n_results: int = 10, where: Optional[Dict] = None):
+        if self.keyword_index is None:
+            return []
+        return self.keyword_index.search(query, n_results=n_results, where=where)
+
+    @property
+    def version(self) -> int:
+        return self.catalog.version
+
+    def count(self, field: Optional[str] = None, value=None) -> int:
+        return self.catalog.count(field, value)
+
+    def query(self, query_embeddings, n_results=5, where: Optional[Dict] = None):
         if isinstance(query_embeddings, torch.Tensor):
-            query_embeddings = query_embeddings.cpu().numpy().tolist()
+            query_embeddings = query_embeddings.detach().cpu().numpy()
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+
+        n_results = min(n_results, self.catalog.total)
+        if n_results <= 0:
+            return empty_query_results(len(query_embeddings))
 
         results = self.collection.query(
             query_embeddings=query_embeddings,
-            n_results=n_results
+            n_results=n_results,
+            where=build_where(where) if where else None
         )
         return results
 
-    def embed_query(self, query, semantical_model=None):
+    def _query_batcher(self, semantical_model):
+        return shared_batcher(
+            ("encode", id(semantical_model)),
+            lambda texts: semantical_model.encode(texts, convert_to_numpy=True),
+            max_batch_size=self.batch_max_size,
+            max_wait_ms=self.batch_max_wait_ms,
+            name="query-encoder"
+        )
+
+    def embed_query(self, query, semantical_model=None) -> np.ndarray:
         if semantical_model is None:
             raise ValueError("A semantical_model must be provided to embed the query.")
 
-        embedding = semantical_model.encode([query], convert_to_tensor=True)
+        encode_fn = self._query_batcher(semantical_model) if self.batch_max_size else None
+        return self.embedding_cache.encode(semantical_model, [query], encode_fn=encode_fn)[0]
 
-        if isinstance(embedding, torch.Tensor):
-            embedding = embedding.detach().cpu().numpy()
+    def embed_queries(self, queries: List[str], semantical_model=None) -> np.ndarray:
+        # Offline/batch path: cache misses go to the model in a single encode call.
+        if semantical_model is None:
+            raise ValueError("A semantical_model must be provided to embed the queries.")
 
-        return embedding[0].tolist()
\ No newline at end of file
+        return self.embedding_cache.encode(semantical_model, list(queries))
@@ -0,0 +1,175 @@
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from rag_system.VectorDB.filters import flatten_where
+
+
+class DocumentTable:
+    # Columnar ids/documents/metadata for the local vector backends.
+    # On disk every column is an append-only JSONL file (one value per row), so adding
+    # chunks never rewrites existing data; replaced or deleted rows are tombstoned.
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+
+        self.ids: List[str] = []
+        self.documents: List[Optional[str]] = []
+        self.columns: Dict[str, List] = {}
+        self.alive: List[bool] = []
+        self.id_to_row: Dict[str, int] = {}
+
+        self._flushed_rows = 0
+        self._pending_deletes: List[int] = []
+        self._column_arrays: Dict[str, np.ndarray] = {}
+        self._alive_array: Optional[np.ndarray] = None
+
+        if path:
+            os.makedirs(os.path.join(path, "columns"), exist_ok=True)
+            self._load()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def live_count(self) -> int:
+        return len(self.id_to_row)
+
+    def _invalidate(self):
+        self._column_arrays = {}
+        self._alive_array = None
+
+    def append(self, ids: Sequence[str], documents: Optional[Sequence[str]] = None,
+               metadatas: Optional[Sequence[Optional[Dict]]] = None) -> np.ndarray:
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [None] * len(ids)
+
+        start = len(self.ids)
+        for offset, (doc_id, document, meta) in enumerate(zip(ids, documents, metadatas)):
+            row = start + offset
+            meta = meta or {}
+
+            if doc_id in self.id_to_row:
+                self.delete([doc_id])
+
+            self.ids.append(doc_id)
+            self.documents.append(document)
+            self.alive.append(True)
+            self.id_to_row[doc_id] = row
+
+            for field in meta:
+                if field not in self.columns:
+                    self.columns[field] = [None] * row
+            for field, column in self.columns.items():
+                column.append(meta.get(field))
+
+        self._invalidate()
+        return np.arange(start, len(self.ids))
+
+    def delete(self, ids: Iterable[str]) -> List[int]:
+        rows = []
+        for doc_id in ids:
+            row = self.id_to_row.pop(doc_id, None)
+            if row is not None:
+                self.alive[row] = False
+                rows.append(row)
+
+        if rows:
+            self._pending_deletes.extend(rows)
+            self._invalidate()
+        return rows
+
+    def metadata(self, row: int) -> Dict:
+        return {
+            field: column[row]
+            for field, column in self.columns.items()
+            if column[row] is not None
+        }
+
+    def alive_mask(self) -> np.ndarray:
+        if self._alive_array is None:
+            self._alive_array = np.asarray(self.alive, dtype=bool)
+        return self._alive_array
+
+    def column(self, field: str) -> np.ndarray:
+        array = self._column_arrays.get(field)
+        if array is None:
+            values = self.columns.get(field, [None] * len(self.ids))
+            array = np.empty(len(values), dtype=object)
+            array[:] = values
+            self._column_arrays[field] = array
+        return array
+
+    def mask(self, where: Optional[Dict] = None) -> np.ndarray:
+        mask = self.alive_mask().copy()
+        for field, value in flatten_where(where).items():
+            mask &= self.column(field) == value
+        return mask
+
+    def live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.alive_mask())
+
+    def _column_path(self, field: str) -> str:
+        return os.path.join(self.path, "columns", quote(field, safe="") + ".jsonl")
+
+    @staticmethod
+    def _append_lines(path: str, values: Iterable):
+        with open(path, "a", encoding="utf8") as f:
+            for value in values:
+                f.write(json.dumps(value, ensure_ascii=False) + "\n")
+
+    def flush(self):
+        if not self.path:
+            return
+
+        start = self._flushed_rows
+        if start < len(self.ids):
+            self._append_lines(os.path.join(self.path, "ids.jsonl"), self.ids[start:])
+            self._append_lines(os.path.join(self.path, "documents.jsonl"), self.documents[start:])
+
+            for field, column in self.columns.items():
+                path = self._column_path(field)
+                if not os.path.exists(path):
+                    # Column first seen now: write the whole column, older rows are None.
+                    self._append_lines(path, column)
+                else:
+                    self._append_lines(path, column[start:])
+
+            self._flushed_rows = len(self.ids)
+
+        if self._pending_deletes:
+            self._append_lines(os.path.join(self.path, "deleted.jsonl"), self._pending_deletes)
+            self._pending_deletes = []
+
+    @staticmethod
+    def _read_lines(path: str) -> List:
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _load(self):
+        self.ids = self._read_lines(os.path.join(self.path, "ids.jsonl"))
+        n_rows = len(self.ids)
+
+        self.documents = self._read_lines(os.path.join(self.path, "documents.jsonl"))[:n_rows]
+        self.documents += [None] * (n_rows - len(self.documents))
+
+        columns_dir = os.path.join(self.path, "columns")
+        for filename in sorted(os.listdir(columns_dir)):
+            if not filename.endswith(".jsonl"):
+                continue
+            values = self._read_lines(os.path.join(columns_dir, filename))[:n_rows]
+            self.columns[unquote(filename[:-len(".jsonl")])] = values + [None] * (n_rows - len(values))
+
+        self.alive = [True] * n_rows
+        for row in self._read_lines(os.path.join(self.path, "deleted.jsonl")):
+            if row < n_rows:
+                self.alive[row] = False
+
+        self.id_to_row = {doc_id: row for row, doc_id in enumerate(self.ids) if self.alive[row]}
+        self._flushed_rows = n_rows
+        self._invalidate()
@@ -0,0 +1,232 @@
+import json
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+from rag_system.VectorDB.local_store import LocalCollection, blocked_topk, exact_search, normalize_rows, rescore
+from rag_system.VectorDB.quantization import load_quantizer, make_quantizer, save_quantizer
+
+
+class MmapMatrix:
+    # Row-major matrix (float32/float16 vectors or int8/uint8 codes) stored raw in <name>.bin
+    # with a small JSON header.
+    # Rows are only ever appended, and reads go through np.memmap.
+
+    def __init__(self, path: str, name: str = "vectors", dtype: str = "float32"):
+        self.bin_path = os.path.join(path, f"{name}.bin")
+        self.header_path = os.path.join(path, f"{name}.json")
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self.rows = 0
+        self._map: Optional[np.memmap] = None
+
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self.header_path):
+            with open(self.header_path, "r", encoding="utf8") as f:
+                header = json.load(f)
+            self.dim = header["dim"]
+            self.dtype = np.dtype(header["dtype"])
+            if os.path.exists(self.bin_path):
+                self.rows = os.path.getsize(self.bin_path) // (self.dim * self.dtype.itemsize)
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows * (self.dim or 0) * self.dtype.itemsize
+
+    def append(self, vectors: np.ndarray):
+        vectors = np.atleast_2d(vectors)
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            with open(self.header_path, "w", encoding="utf8") as f:
+                json.dump({"dim": self.dim, "dtype": self.dtype.name}, f)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got {vectors.shape[1]}.")
+
+        with open(self.bin_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=self.dtype).tobytes())
+        self.rows += len(vectors)
+
+    def truncate(self, rows: int):
+        # Drops rows written after the last complete table flush (e.g. after a crash), and any
+        # partial row, from the file itself so the next append lines up with the table again.
+        self.rows = min(self.rows, rows)
+        self._map = None
+        if self.dim is not None and os.path.exists(self.bin_path):
+            size = self.rows * self.dim * self.dtype.itemsize
+            if os.path.getsize(self.bin_path) != size:
+                os.truncate(self.bin_path, size)
+
+    def clear(self):
+        for path in (self.bin_path, self.header_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.dim = None
+        self.rows = 0
+        self._map = None
+
+    def matrix(self) -> np.ndarray:
+        if self.rows == 0:
+            return np.zeros((0, self.dim or 0), dtype=self.dtype)
+        if self._map is None or self._map.shape[0] != self.rows:
+            self._map = np.memmap(self.bin_path, dtype=self.dtype, mode="r", shape=(self.rows, self.dim))
+        return self._map
+
+
+class ExactCollection(LocalCollection):
+    # Brute-force search over the memory-mapped matrix. With `quantization` ("int8" or "pq")
+    # the first pass scans compact codes instead, and the best `rescore_factor * n_results`
+    # candidates are re-ranked with the full-precision vectors, which stay on disk. The
+    # quantizer is trained once the collection holds `train_size` vectors; until then
+    # searches are exact.
+    # For Matryoshka (MRL) embeddings, `prefix_dims` keeps a second matrix with the
+    # re-normalized first N dimensions; the first pass scans it and the best
+    # `shortlist_size` rows are rescored with the full vectors.
+
+    def __init__(self, path: str, dtype: str = "float32", block_size: int = 65536,
+                 gather_fraction: float = 0.05, quantization: Optional[str] = None,
+                 rescore_factor: int = 4, train_size: int = 10000, quantizer_params: Optional[Dict] = None,
+                 prefix_dims: Optional[int] = None, shortlist_size: int = 200):
+        super().__init__(path)
+        self.block_size = block_size
+        self.gather_fraction = gather_fraction
+        self.rescore_factor = rescore_factor
+        self.train_size = train_size
+        self.shortlist_size = shortlist_size
+        self.matrix = MmapMatrix(path, dtype=dtype)
+
+        if len(self.matrix) < len(self.table):
+            raise ValueError(
+                f"Embedding matrix ({len(self.matrix)} rows) is shorter than the document table "
+                f"({len(self.table)} rows) in {path}."
+            )
+        self.matrix.truncate(len(self.table))
+
+        if quantization and prefix_dims:
+            raise ValueError("quantization and prefix_dims are alternative first passes, set only one of them.")
+
+        self.quantizer = None
+        self.codes: Optional[MmapMatrix] = None
+        if quantization:
+            self._init_quantizer(quantization, quantizer_params or {})
+
+        self.prefix_dims = prefix_dims
+        self.prefix: Optional[MmapMatrix] = None
+        if prefix_dims:
+            self._init_prefix(dtype)
+
+    def _init_prefix(self, dtype: str):
+        prefix = MmapMatrix(self.path, name="prefix", dtype=dtype)
+        if prefix.dim is not None and prefix.dim != self.prefix_dims:
+            prefix.clear()
+        if self.matrix.dim is not None and self.prefix_dims >= self.matrix.dim:
+            raise ValueError(f"prefix_dims={self.prefix_dims} must be smaller than the embedding dimension {self.matrix.dim}.")
+
+        self.prefix = prefix
+        self.prefix.truncate(len(self.matrix))
+        matrix = self.matrix.matrix()
+        for start in range(len(self.prefix), len(matrix), self.block_size):
+            block = np.asarray(matrix[start:start + self.block_size, :self.prefix_dims], dtype=np.float32)
+            self.prefix.append(normalize_rows(block))
+
+    def _init_quantizer(self, kind: str, params: Dict):
+        quantizer_path = os.path.join(self.path, "quantizer.npz")
+        quantizer = load_quantizer(quantizer_path, **params) if os.path.exists(quantizer_path) else None
+
+        if quantizer is None or quantizer.kind != kind:
+            # New collection or quantization switched: old codes are useless.
+            quantizer = make_quantizer(kind, **params)
+            MmapMatrix(self.path, name="codes").clear()
+            if os.path.exists(quantizer_path):
+                os.remove(quantizer_path)
+
+        self.quantizer = quantizer
+        self.codes = MmapMatrix(self.path, name="codes", dtype=quantizer.code_dtype)
+        if quantizer.trained:
+            self.codes.truncate(len(self.matrix))
+            self._encode_missing()
+        elif len(self.matrix) >= self.train_size:
+            self._train_quantizer()
+
+    def _encode_missing(self):
+        matrix = self.matrix.matrix()
+        for start in range(len(self.codes), len(matrix), self.block_size):
+            block = np.asarray(matrix[start:start + self.block_size], dtype=np.float32)
+            self.codes.append(self.quantizer.encode(block))
+
+    def _train_quantizer(self):
+        matrix = self.matrix.matrix()
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(len(matrix), min(self.train_size, len(matrix)), replace=False))
+        self.quantizer.train(np.asarray(matrix[sample], dtype=np.float32))
+        save_quantizer(os.path.join(self.path, "quantizer.npz"), self.quantizer)
+        self._encode_missing()
+
+    def _add_vectors(self, rows: np.ndarray, vectors: np.ndarray):
+        vectors = normalize_rows(vectors)
+        start = len(self.matrix)
+        try:
+            self.matrix.append(vectors)
+
+            if self.prefix is not None:
+                self.prefix.append(normalize_rows(vectors[:, :self.prefix_dims]))
+
+            if self.quantizer is not None and self.quantizer.trained:
+                # Also encodes rows an interrupted _encode_missing left without codes.
+                self._encode_missing()
+        except Exception:
+            for matrix in (self.matrix, self.prefix, self.codes):
+                if matrix is not None:
+                    matrix.truncate(min(len(matrix), start))
+            raise
+
+    def _save_vectors(self):
+        # Training runs once the new rows are in the table, so a failure cannot misalign them.
+        if self.quantizer is not None and not self.quantizer.trained and len(self.matrix) >= self.train_size:
+            self._train_quantizer()
+
+    def index_bytes(self) -> Dict[str, int]:
+        # "vectors" is only paged in by exact scans and rescoring; "codes" and "prefix" are
+        # what the quantized and Matryoshka first passes read.
+        return {
+            "vectors": self.matrix.nbytes,
+            "codes": self.codes.nbytes if self.codes is not None else 0,
+            "prefix": self.prefix.nbytes if self.prefix is not None else 0,
+        }
+
+    def _search(self, queries: np.ndarray, n_results: int, mask: Optional[np.ndarray]):
+        matrix = self.matrix.matrix()
+        if n_results <= 0 or matrix.shape[0] == 0:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+
+        if mask is not None:
+            allowed = np.flatnonzero(mask)
+            # Selective filters: gather the allowed rows instead of scanning every block.
+            if len(allowed) <= self.gather_fraction * matrix.shape[0]:
+                vectors = np.asarray(matrix[allowed], dtype=np.float32)
+                return [
+                    (allowed[rows], sims)
+                    for rows, sims in exact_search(vectors, queries, n_results)
+                ]
+
+        if self.quantizer is not None and self.quantizer.trained:
+            candidates = blocked_topk(
+                self.codes.matrix(), queries, n_results * self.rescore_factor, mask=mask,
+                block_size=self.block_size, score=self.quantizer.scorer(queries),
+            )
+            return rescore(matrix, queries, candidates, n_results)
+
+        if self.prefix is not None:
+            candidates = blocked_topk(
+                self.prefix.matrix(), normalize_rows(queries[:, :self.prefix_dims]),
+                max(self.shortlist_size, n_results), mask=mask, block_size=self.block_size,
+            )
+            return rescore(matrix, queries, candidates, n_results)
+
+        return blocked_topk(matrix, queries, n_results, mask=mask, block_size=self.block_size)
+
+    def _vectors(self, rows: np.ndarray) -> np.ndarray:
+        return np.asarray(self.matrix.matrix()[rows], dtype=np.float32)
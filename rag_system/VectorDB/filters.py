@@ -0,0 +1,34 @@
+from typing import Dict, Optional
+
+
+def build_where(filters: Dict) -> Optional[Dict]:
+    filters = {key: value for key, value in (filters or {}).items() if value is not None}
+    if not filters:
+        return None
+    if len(filters) == 1:
+        return filters
+    return {"$and": [{key: value} for key, value in filters.items()]}
+
+
+def flatten_where(where: Optional[Dict]) -> Dict:
+    # Inverse of build_where: {"$and": [{"a": 1}, {"b": 2}]} -> {"a": 1, "b": 2}
+    if not where:
+        return {}
+
+    flat = {}
+    for key, value in where.items():
+        if key == "$and":
+            for clause in value:
+                flat.update(flatten_where(clause))
+        elif isinstance(value, dict) and "$eq" in value:
+            flat[key] = value["$eq"]
+        elif key.startswith("$"):
+            raise ValueError(f"Unsupported where operator: {key}")
+        else:
+            flat[key] = value
+    return flat
+
+
+def matches_where(meta: Optional[Dict], where: Optional[Dict]) -> bool:
+    meta = meta or {}
+    return all(meta.get(key) == value for key, value in flatten_where(where).items())
@@ -0,0 +1,444 @@
+import heapq
+import json
+import math
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from rag_system.VectorDB.local_store import LocalCollection, exact_search, normalize_rows
+
+HNSW_FORMAT_VERSION = 2
+
+
+def _write_rows(path: str, array: np.ndarray, start: int):
+    # Writes `array` as rows start.. of the raw file at `path`, dropping anything after them
+    # (left over by an interrupted save).
+    row_bytes = int(np.prod(array.shape[1:], dtype=np.int64)) * array.itemsize
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        f.seek(start * row_bytes)
+        f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate()
+
+
+def _patch_rows(path: str, array: np.ndarray, rows: np.ndarray):
+    # Rewrites the given rows of the raw file at `path` in place.
+    row_bytes = int(np.prod(array.shape[1:], dtype=np.int64)) * array.itemsize
+    with open(path, "r+b") as f:
+        for row in rows.tolist():
+            f.seek(row * row_bytes)
+            f.write(np.ascontiguousarray(array[row]).tobytes())
+
+
+def _read_rows(path: str, dtype, count: int, width: Optional[int] = None) -> np.ndarray:
+    data = np.fromfile(path, dtype=dtype) if os.path.exists(path) else np.zeros(0, dtype=dtype)
+    if width is None:
+        return data[:count].copy()
+    return data[:count * width].reshape(count, width).copy()
+
+
+class HNSWIndex:
+    # Cosine HNSW over normalized float32 vectors, ported from the HNSW class in
+    # benchmark_ED/notebooks/Trabalho_Final_ED.ipynb. Adjacency is stored per layer as a
+    # fixed-width int32 matrix (-1 padded) with a degree vector; upper layers map node ids
+    # to rows through a slot array, so memory grows with the nodes actually on each layer.
+    # On disk every array is a raw file: saving appends the new nodes and rewrites in place
+    # only the adjacency rows that changed since the last save, then commits a JSON header.
+
+    def __init__(self, dim: Optional[int] = None, M: int = 16, ef_construction: int = 200,
+                 ef_search: int = 64, seed: int = 42):
+        self.M = M
+        self.M0 = 2 * M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.mL = 1.0 / math.log(max(M, 2))
+        self.rng = np.random.default_rng(seed)
+
+        self.dim = dim
+        self.size = 0
+        self.entry_point = -1
+        self.max_level = -1
+
+        self.vectors = np.zeros((0, dim or 0), dtype=np.float32)
+        self.levels = np.zeros(0, dtype=np.int8)
+
+        self.neighbors: List[np.ndarray] = []
+        self.degrees: List[np.ndarray] = []
+        self.slots: List[Optional[np.ndarray]] = []
+        self.layer_sizes: List[int] = []
+
+        # What the files under the last save directory hold, and adjacency rows changed since.
+        self._saved_size = 0
+        self._saved_rows: List[int] = []
+        self._saved_slots: List[int] = []
+        self._dirty: List[set] = []
+
+        self._local = threading.local()
+
+    def __len__(self):
+        return self.size
+
+    # ------------------------------------------------------------------ storage
+
+    def _width(self, layer: int) -> int:
+        return self.M0 if layer == 0 else self.M
+
+    def _capacity(self) -> int:
+        return self.vectors.shape[0]
+
+    def _grow(self, n_new: int):
+        needed = self.size + n_new
+        capacity = self._capacity()
+        if needed <= capacity:
+            return
+
+        new_capacity = max(needed, 2 * capacity, 1024)
+        vectors = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        vectors[:self.size] = self.vectors[:self.size]
+        self.vectors = vectors
+
+        levels = np.zeros(new_capacity, dtype=np.int8)
+        levels[:self.size] = self.levels[:self.size]
+        self.levels = levels
+
+        for layer in range(len(self.neighbors)):
+            if layer == 0:
+                self._grow_layer_rows(0, new_capacity)
+            else:
+                slots = np.full(new_capacity, -1, dtype=np.int32)
+                slots[:capacity] = self.slots[layer]
+                self.slots[layer] = slots
+
+    def _grow_layer_rows(self, layer: int, rows: int):
+        current = self.neighbors[layer].shape[0]
+        if rows <= current:
+            return
+        neighbors = np.full((rows, self._width(layer)), -1, dtype=np.int32)
+        neighbors[:current] = self.neighbors[layer]
+        degrees = np.zeros(rows, dtype=np.int32)
+        degrees[:current] = self.degrees[layer]
+        self.neighbors[layer] = neighbors
+        self.degrees[layer] = degrees
+
+    def _ensure_layer(self, layer: int):
+        while len(self.neighbors) <= layer:
+            new_layer = len(self.neighbors)
+            rows = self._capacity() if new_layer == 0 else 64
+            self.neighbors.append(np.full((rows, self._width(new_layer)), -1, dtype=np.int32))
+            self.degrees.append(np.zeros(rows, dtype=np.int32))
+            self.slots.append(None if new_layer == 0 else np.full(self._capacity(), -1, dtype=np.int32))
+            self.layer_sizes.append(0)
+            self._dirty.append(set())
+
+    def _add_to_layer(self, layer: int, node: int):
+        if layer > 0:
+            row = self.layer_sizes[layer]
+            if row >= self.neighbors[layer].shape[0]:
+                self._grow_layer_rows(layer, 2 * self.neighbors[layer].shape[0])
+            self.slots[layer][node] = row
+        self.layer_sizes[layer] += 1
+
+    def _row(self, layer: int, node: int) -> int:
+        return node if layer == 0 else int(self.slots[layer][node])
+
+    def _get_neighbors(self, layer: int, node: int) -> np.ndarray:
+        row = self._row(layer, node)
+        return self.neighbors[layer][row, :self.degrees[layer][row]]
+
+    def _set_neighbors(self, layer: int, node: int, nodes: np.ndarray):
+        self._set_neighbors_row(layer, self._row(layer, node), nodes)
+
+    def _set_neighbors_row(self, layer: int, row: int, nodes: np.ndarray):
+        self.neighbors[layer][row, :len(nodes)] = nodes
+        self.neighbors[layer][row, len(nodes):] = -1
+        self.degrees[layer][row] = len(nodes)
+        self._dirty[layer].add(row)
+
+    # ------------------------------------------------------------------ search
+
+    def _visited(self) -> Tuple[np.ndarray, int]:
+        # Tag-stamped visited array, one per thread, reused across searches.
+        visited = getattr(self._local, "visited", None)
+        if visited is None or visited.shape[0] < self._capacity():
+            visited = np.zeros(self._capacity(), dtype=np.uint32)
+            self._local.visited = visited
+            self._local.tag = 0
+        self._local.tag += 1
+        if self._local.tag == np.iinfo(np.uint32).max:
+            visited[:] = 0
+            self._local.tag = 1
+        return visited, self._local.tag
+
+    def _distances(self, query: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        return 1.0 - self.vectors[nodes] @ query
+
+    def _search_layer(self, query: np.ndarray, entry_points: List[int], ef: int, layer: int,
+                      allowed: Optional[np.ndarray] = None) -> List[Tuple[float, int]]:
+        visited, tag = self._visited()
+
+        entries = np.asarray(entry_points, dtype=np.int64)
+        visited[entries] = tag
+        entry_dists = self._distances(query, entries)
+
+        candidates = [(float(d), int(n)) for d, n in zip(entry_dists, entries)]
+        heapq.heapify(candidates)
+        results = [(-d, n) for d, n in candidates if allowed is None or allowed[n]]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            dist, node = heapq.heappop(candidates)
+            if len(results) >= ef and dist > -results[0][0]:
+                break
+
+            neighbors = self._get_neighbors(layer, node)
+            if len(neighbors) == 0:
+                continue
+            neighbors = neighbors[visited[neighbors] != tag]
+            if len(neighbors) == 0:
+                continue
+            visited[neighbors] = tag
+
+            worst = -results[0][0] if len(results) >= ef else math.inf
+            for d, n in zip(self._distances(query, neighbors).tolist(), neighbors.tolist()):
+                if d < worst or len(results) < ef:
+                    heapq.heappush(candidates, (d, n))
+                    if allowed is None or allowed[n]:
+                        heapq.heappush(results, (-d, n))
+                        if len(results) > ef:
+                            heapq.heappop(results)
+                        worst = -results[0][0] if len(results) >= ef else math.inf
+
+        return sorted((-d, n) for d, n in results)
+
+    def _select_neighbors(self, candidates: List[Tuple[float, int]], m: int) -> np.ndarray:
+        # Heuristic from the HNSW paper (keepPrunedConnections=True), with the pairwise
+        # distances between candidates computed in one matrix product.
+        nodes = np.asarray([n for _, n in candidates], dtype=np.int64)
+        if len(nodes) <= m:
+            return nodes
+
+        dists = np.asarray([d for d, _ in candidates], dtype=np.float32)
+        vectors = self.vectors[nodes]
+        pairwise = 1.0 - vectors @ vectors.T
+
+        selected = []
+        pruned = []
+        for i in range(len(nodes)):
+            if not selected or pairwise[i, selected].min() >= dists[i]:
+                selected.append(i)
+                if len(selected) == m:
+                    break
+            else:
+                pruned.append(i)
+
+        for i in pruned:
+            if len(selected) == m:
+                break
+            selected.append(i)
+
+        return nodes[selected]
+
+    def _insert(self, vector: np.ndarray) -> int:
+        node = self.size
+        self.vectors[node] = vector
+        self.size += 1
+
+        level = int(-math.log(max(self.rng.random(), 1e-12)) * self.mL)
+        self.levels[node] = level
+        self._ensure_layer(level)
+        for layer in range(level + 1):
+            self._add_to_layer(layer, node)
+
+        if self.entry_point < 0:
+            self.entry_point = node
+            self.max_level = level
+            return node
+
+        entry_points = [self.entry_point]
+        for layer in range(self.max_level, level, -1):
+            entry_points = [self._search_layer(vector, entry_points, 1, layer)[0][1]]
+
+        for layer in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(vector, entry_points, self.ef_construction, layer)
+            width = self._width(layer)
+
+            selected = self._select_neighbors(found, self.M)
+            self._set_neighbors(layer, node, selected)
+
+            for neighbor in selected.tolist():
+                current = self._get_neighbors(layer, neighbor)
+                if len(current) < width:
+                    self._set_neighbors(layer, neighbor, np.append(current, node))
+                    continue
+
+                pool = np.append(current, node)
+                pool_dists = self._distances(self.vectors[neighbor], pool)
+                order = np.argsort(pool_dists, kind="stable")
+                ranked = [(float(pool_dists[i]), int(pool[i])) for i in order]
+                self._set_neighbors(layer, neighbor, self._select_neighbors(ranked, width))
+
+            entry_points = [n for _, n in found]
+
+        if level > self.max_level:
+            self.entry_point = node
+            self.max_level = level
+
+        return node
+
+    def add(self, vectors) -> np.ndarray:
+        vectors = normalize_rows(vectors)
+        if self.size == 0 and self.dim != vectors.shape[1]:
+            self.dim = vectors.shape[1]
+            self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got {vectors.shape[1]}.")
+
+        self._grow(len(vectors))
+        return np.asarray([self._insert(vector) for vector in vectors], dtype=np.int64)
+
+    def search(self, query: np.ndarray, k: int, ef: Optional[int] = None,
+               allowed: Optional[np.ndarray] = None, brute_force_threshold: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        if self.size == 0 or k <= 0:
+            return empty
+
+        query = normalize_rows(query)[0]
+
+        if allowed is not None:
+            allowed = allowed[:self.size]
+            allowed_rows = np.flatnonzero(allowed)
+            if len(allowed_rows) == 0:
+                return empty
+            # Very selective filters: scanning the allowed rows is cheaper than the graph walk.
+            if len(allowed_rows) <= max(brute_force_threshold, k):
+                return exact_search(self.vectors, query[None, :], k, rows=allowed_rows)[0]
+
+        entry_points = [self.entry_point]
+        for layer in range(self.max_level, 0, -1):
+            entry_points = [self._search_layer(query, entry_points, 1, layer)[0][1]]
+
+        found = self._search_layer(query, entry_points, max(ef or self.ef_search, k), 0, allowed=allowed)[:k]
+        nodes = np.asarray([n for _, n in found], dtype=np.int64)
+        sims = 1.0 - np.asarray([d for d, _ in found], dtype=np.float32)
+        return nodes, sims
+
+    # ------------------------------------------------------------------ persistence
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        _write_rows(os.path.join(directory, "vectors.bin"), self.vectors[self._saved_size:self.size], self._saved_size)
+        _write_rows(os.path.join(directory, "levels.bin"), self.levels[self._saved_size:self.size], self._saved_size)
+
+        for layer in range(len(self.neighbors)):
+            rows = self.size if layer == 0 else self.layer_sizes[layer]
+            saved_rows = self._saved_rows[layer] if layer < len(self._saved_rows) else 0
+            for name, array in (("neighbors", self.neighbors[layer]), ("degrees", self.degrees[layer])):
+                path = os.path.join(directory, f"{name}_{layer}.bin")
+                changed = np.asarray(sorted(row for row in self._dirty[layer] if row < saved_rows), dtype=np.int64)
+                if len(changed):
+                    _patch_rows(path, array, changed)
+                _write_rows(path, array[saved_rows:rows], saved_rows)
+
+            if layer > 0:
+                # A layer created since the last save needs the slots of the older nodes too.
+                saved_slots = self._saved_slots[layer] if layer < len(self._saved_slots) else 0
+                _write_rows(os.path.join(directory, f"slots_{layer}.bin"), self.slots[layer][saved_slots:self.size], saved_slots)
+
+        header = {
+            "format_version": HNSW_FORMAT_VERSION,
+            "M": self.M,
+            "ef_construction": self.ef_construction,
+            "ef_search": self.ef_search,
+            "entry_point": self.entry_point,
+            "max_level": self.max_level,
+            "dim": self.dim,
+            "size": self.size,
+            "layer_sizes": self.layer_sizes,
+        }
+        tmp_path = os.path.join(directory, "header.json.tmp")
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump(header, f)
+        os.replace(tmp_path, os.path.join(directory, "header.json"))
+
+        self._saved_size = self.size
+        self._saved_rows = [self.size] + self.layer_sizes[1:]
+        self._saved_slots = [self.size] * len(self.neighbors)
+        self._dirty = [set() for _ in self.neighbors]
+
+    @classmethod
+    def load(cls, directory: str, ef_search: Optional[int] = None) -> "HNSWIndex":
+        with open(os.path.join(directory, "header.json"), "r", encoding="utf8") as f:
+            header = json.load(f)
+        if header.get("format_version") != HNSW_FORMAT_VERSION:
+            raise ValueError(f"Unsupported HNSW index format {header.get('format_version')} in {directory}.")
+
+        size, dim = header["size"], header["dim"]
+        index = cls(dim=dim, M=header["M"], ef_construction=header["ef_construction"],
+                    ef_search=ef_search or header["ef_search"])
+        index.size = size
+        index.entry_point = header["entry_point"]
+        index.max_level = header["max_level"]
+        index.vectors = _read_rows(os.path.join(directory, "vectors.bin"), np.float32, size, dim or 0)
+        index.levels = _read_rows(os.path.join(directory, "levels.bin"), np.int8, size)
+
+        for layer, layer_size in enumerate(header["layer_sizes"]):
+            rows = size if layer == 0 else layer_size
+            index.neighbors.append(_read_rows(os.path.join(directory, f"neighbors_{layer}.bin"), np.int32, rows, index._width(layer)))
+            index.degrees.append(_read_rows(os.path.join(directory, f"degrees_{layer}.bin"), np.int32, rows))
+            index.slots.append(_read_rows(os.path.join(directory, f"slots_{layer}.bin"), np.int32, size) if layer > 0 else None)
+            index.layer_sizes.append(layer_size)
+            index._dirty.append(set())
+        index._drop_unsaved_links()
+
+        index._saved_size = size
+        index._saved_rows = [size] + index.layer_sizes[1:]
+        index._saved_slots = [size] * len(index.neighbors)
+        return index
+
+    def _drop_unsaved_links(self):
+        # A save interrupted before its header was written may have patched rows with links to
+        # nodes the header does not cover yet (or a degree without its neighbors); those links
+        # are removed, and the rows rewritten on the next save.
+        for layer, (neighbors, degrees) in enumerate(zip(self.neighbors, self.degrees)):
+            in_degree = np.arange(neighbors.shape[1])[None, :] < degrees[:, None]
+            broken = ((neighbors >= self.size) | ((neighbors < 0) & in_degree)).any(axis=1)
+            for row in np.flatnonzero(broken).tolist():
+                current = neighbors[row, :degrees[row]]
+                self._set_neighbors_row(layer, row, current[(current >= 0) & (current < self.size)])
+
+
+class HNSWCollection(LocalCollection):
+    def __init__(self, path: str, M: int = 16, ef_construction: int = 200, ef_search: int = 64,
+                 brute_force_threshold: int = 2048):
+        super().__init__(path)
+        self.brute_force_threshold = brute_force_threshold
+        self.index_path = os.path.join(path, "hnsw")
+
+        if os.path.exists(os.path.join(self.index_path, "header.json")):
+            self.index = HNSWIndex.load(self.index_path, ef_search=ef_search)
+        else:
+            self.index = HNSWIndex(M=M, ef_construction=ef_construction, ef_search=ef_search)
+
+        if self.index.size != len(self.table):
+            raise ValueError(
+                f"HNSW index ({self.index.size} vectors) and document table ({len(self.table)} rows) "
+                f"in {path} are out of sync."
+            )
+
+    def _add_vectors(self, rows: np.ndarray, vectors: np.ndarray):
+        self.index.add(vectors)
+
+    def _search(self, queries: np.ndarray, n_results: int, mask: Optional[np.ndarray]):
+        return [
+            self.index.search(query, n_results, allowed=mask, brute_force_threshold=self.brute_force_threshold)
+            for query in queries
+        ]
+
+    def _vectors(self, rows: np.ndarray) -> np.ndarray:
+        return self.index.vectors[rows]
+
+    def _save_vectors(self):
+        self.index.save(self.index_path)
@@ -0,0 +1,187 @@
+import abc
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag_system.VectorDB.document_table import DocumentTable
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class LocalCollection(abc.ABC):
+    # Subset of the Chroma collection API (count/get/upsert/delete/query) over a
+    # DocumentTable plus a vector index provided by the subclass. Distances are cosine
+    # distances, like the "hnsw:space": "cosine" Chroma collection.
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.table = DocumentTable(os.path.join(path, "table"))
+        self._lock = threading.RLock()
+
+    @abc.abstractmethod
+    def _add_vectors(self, rows: np.ndarray, vectors: np.ndarray):
+        # Must leave the index unchanged when it raises.
+        pass
+
+    @abc.abstractmethod
+    def _search(self, queries: np.ndarray, n_results: int, mask: Optional[np.ndarray]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        # Returns, per query, (rows, cosine similarities) sorted by decreasing similarity.
+        pass
+
+    @abc.abstractmethod
+    def _vectors(self, rows: np.ndarray) -> np.ndarray:
+        pass
+
+    def _save_vectors(self):
+        pass
+
+    def count(self) -> int:
+        return self.table.live_count
+
+    def upsert(self, ids, embeddings, metadatas=None, documents=None):
+        vectors = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if len(vectors) != len(ids):
+            raise ValueError("ids and embeddings must have the same length.")
+
+        with self._lock:
+            # Vectors first: if the index rejects them the table is left as it was.
+            rows = np.arange(len(self.table), len(self.table) + len(ids))
+            self._add_vectors(rows, vectors)
+            self.table.append(list(ids), documents, metadatas)
+            self._save_vectors()
+            self.table.flush()
+
+    add = upsert
+
+    def delete(self, ids=None, where: Optional[Dict] = None):
+        with self._lock:
+            if ids is None and where is not None:
+                ids = [self.table.ids[row] for row in np.flatnonzero(self.table.mask(where))]
+            self.table.delete(ids or [])
+            self.table.flush()
+
+    def _rows_payload(self, rows: Sequence[int], include: Sequence[str]) -> Dict:
+        payload = {"ids": [self.table.ids[row] for row in rows]}
+        if "documents" in include:
+            payload["documents"] = [self.table.documents[row] for row in rows]
+        if "metadatas" in include:
+            payload["metadatas"] = [self.table.metadata(row) for row in rows]
+        if "embeddings" in include:
+            payload["embeddings"] = self._vectors(np.asarray(rows, dtype=np.int64)) if len(rows) else []
+        return payload
+
+    def get(self, ids=None, where: Optional[Dict] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, include=("documents", "metadatas")) -> Dict:
+        with self._lock:
+            if ids is not None:
+                rows = [self.table.id_to_row[doc_id] for doc_id in ids if doc_id in self.table.id_to_row]
+            else:
+                rows = np.flatnonzero(self.table.mask(where)).tolist()
+                start = offset or 0
+                rows = rows[start:start + limit] if limit is not None else rows[start:]
+            return self._rows_payload(rows, include)
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict] = None,
+              include=("documents", "metadatas", "distances")) -> Dict:
+        queries = normalize_rows(query_embeddings)
+
+        with self._lock:
+            mask = self.table.mask(where)
+            hits = self._search(queries, n_results, mask)
+
+            results = {key: [] for key in ("ids", "documents", "metadatas", "distances", "embeddings")
+                       if key == "ids" or key in include}
+            for rows, sims in hits:
+                payload = self._rows_payload(rows.tolist(), include)
+                for key, values in payload.items():
+                    results[key].append(values)
+                if "distances" in include:
+                    results["distances"].append((1.0 - sims).tolist())
+            return results
+
+
+def exact_search(vectors: np.ndarray, queries: np.ndarray, n_results: int,
+                 rows: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+    # Brute-force cosine search over normalized `vectors`, optionally restricted to `rows`.
+    candidates = vectors if rows is None else vectors[rows]
+    if len(candidates) == 0 or n_results <= 0:
+        return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+
+    sims = queries @ candidates.T
+    k = min(n_results, candidates.shape[0])
+
+    hits = []
+    for q_sims in sims:
+        top = np.argpartition(-q_sims, k - 1)[:k] if k < len(q_sims) else np.arange(len(q_sims))
+        top = top[np.argsort(-q_sims[top], kind="stable")]
+        found = top if rows is None else rows[top]
+        hits.append((found.astype(np.int64), q_sims[top]))
+    return hits
+
+
+def blocked_topk(matrix: np.ndarray, queries: np.ndarray, k: int, mask: Optional[np.ndarray] = None,
+                 block_size: int = 65536,
+                 score: Optional[Callable[[np.ndarray], np.ndarray]] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+    # Top-k scan of `matrix` in row blocks so only one block is converted at a time. By
+    # default the score is the inner product with `queries`; `score(block)` overrides it
+    # (e.g. for quantized codes) and must return a (n_queries, block_rows) array.
+    n_queries = len(queries)
+    best_rows = np.zeros((n_queries, 0), dtype=np.int64)
+    best_sims = np.zeros((n_queries, 0), dtype=np.float32)
+
+    for start in range(0, matrix.shape[0], block_size):
+        end = min(start + block_size, matrix.shape[0])
+        block_mask = mask[start:end] if mask is not None else None
+        if block_mask is not None and not block_mask.any():
+            continue
+
+        if score is None:
+            sims = queries @ np.asarray(matrix[start:end], dtype=np.float32).T
+        else:
+            sims = np.asarray(score(np.asarray(matrix[start:end])), dtype=np.float32)
+        if block_mask is not None:
+            sims[:, ~block_mask] = -np.inf
+
+        kb = min(k, end - start)
+        top = np.argpartition(-sims, kb - 1, axis=1)[:, :kb]
+        best_sims = np.concatenate([best_sims, np.take_along_axis(sims, top, axis=1)], axis=1)
+        best_rows = np.concatenate([best_rows, top + start], axis=1)
+
+        if best_sims.shape[1] > k:
+            keep = np.argpartition(-best_sims, k - 1, axis=1)[:, :k]
+            best_sims = np.take_along_axis(best_sims, keep, axis=1)
+            best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+    hits = []
+    for rows, sims in zip(best_rows, best_sims):
+        order = np.argsort(-sims, kind="stable")
+        rows, sims = rows[order], sims[order]
+        valid = np.isfinite(sims)
+        hits.append((rows[valid], sims[valid]))
+    return hits
+
+
+def rescore(vectors: np.ndarray, queries: np.ndarray, candidates: List[Tuple[np.ndarray, np.ndarray]],
+            n_results: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    # Second stage of a two-stage search: re-ranks each query's candidate rows with the
+    # full-precision `vectors` (rows are read in sorted order, which is friendlier to memmaps).
+    hits = []
+    for query, (rows, _) in zip(queries, candidates):
+        if len(rows) == 0:
+            hits.append((rows, np.zeros(0, dtype=np.float32)))
+            continue
+        rows = np.sort(rows)
+        sims = np.asarray(vectors[rows], dtype=np.float32) @ query
+        k = min(n_results, len(rows))
+        top = np.argpartition(-sims, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+        top = top[np.argsort(-sims[top], kind="stable")]
+        hits.append((rows[top], sims[top]))
+    return hits
@@ -0,0 +1,151 @@
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+
+class ScalarQuantizer:
+    # Per-dimension int8 quantization: 1 byte per value, i.e. 4x smaller than float32.
+    kind = "int8"
+    code_dtype = "int8"
+
+    def __init__(self):
+        self.low: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    @property
+    def trained(self) -> bool:
+        return self.low is not None
+
+    def train(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.low = vectors.min(axis=0)
+        scale = (vectors.max(axis=0) - self.low) / 255.0
+        scale[scale == 0] = 1.0
+        self.scale = scale.astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.low) / self.scale) - 128
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return (codes.astype(np.float32) + 128) * self.scale + self.low
+
+    def scorer(self, queries: np.ndarray) -> Callable[[np.ndarray], np.ndarray]:
+        # q . decode(c) = (q * scale) . c + q . (low + 128 * scale), so blocks are never decoded.
+        weighted = queries * self.scale
+        bias = queries @ (self.low + 128 * self.scale)
+        return lambda codes: weighted @ codes.astype(np.float32).T + bias[:, None]
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"low": self.low, "scale": self.scale}
+
+    def load_state(self, state):
+        self.low = state["low"]
+        self.scale = state["scale"]
+
+
+class ProductQuantizer:
+    # Splits vectors into `n_subspaces` chunks and stores the id of the nearest of
+    # `n_centroids` k-means centroids per chunk (1 byte each). Scores use asymmetric
+    # distance computation: one lookup table per query, no decoding.
+    kind = "pq"
+    code_dtype = "uint8"
+
+    def __init__(self, n_subspaces: Optional[int] = None, n_centroids: int = 256, n_iter: int = 20, seed: int = 42):
+        if n_centroids > 256:
+            raise ValueError("ProductQuantizer codes are stored as uint8, n_centroids must be <= 256.")
+        self.n_subspaces = n_subspaces
+        self.n_centroids = n_centroids
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        # (n, dim) -> (n_subspaces, n, sub_dim)
+        n = len(vectors)
+        return np.asarray(vectors, dtype=np.float32).reshape(n, self.n_subspaces, -1).transpose(1, 0, 2)
+
+    @staticmethod
+    def _assign(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        distances = (centroids ** 2).sum(axis=1)[None, :] - 2 * points @ centroids.T
+        return distances.argmin(axis=1)
+
+    def train(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        dim = vectors.shape[1]
+        if self.n_subspaces is None:
+            self.n_subspaces = max(1, dim // 4)
+        if dim % self.n_subspaces:
+            raise ValueError(f"Embedding dimension {dim} is not divisible by n_subspaces={self.n_subspaces}.")
+
+        rng = np.random.default_rng(self.seed)
+        k = min(self.n_centroids, len(vectors))
+        centroids = []
+        for points in self._split(vectors):
+            centers = points[rng.choice(len(points), k, replace=False)].copy()
+            for _ in range(self.n_iter):
+                labels = self._assign(points, centers)
+                sums = np.zeros_like(centers)
+                np.add.at(sums, labels, points)
+                counts = np.bincount(labels, minlength=k)
+                filled = counts > 0
+                centers[filled] = sums[filled] / counts[filled, None]
+            centroids.append(centers)
+        self.centroids = np.stack(centroids)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = [self._assign(points, centers) for points, centers in zip(self._split(vectors), self.centroids)]
+        return np.stack(codes, axis=1).astype(np.uint8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = [self.centroids[j][codes[:, j]] for j in range(self.n_subspaces)]
+        return np.concatenate(parts, axis=1)
+
+    def scorer(self, queries: np.ndarray) -> Callable[[np.ndarray], np.ndarray]:
+        # tables[j, q, c] = inner product of query q's j-th chunk with centroid c of subspace j.
+        tables = np.einsum("mqd,mkd->mqk", self._split(queries), self.centroids)
+
+        def score(codes: np.ndarray) -> np.ndarray:
+            sims = np.zeros((len(queries), len(codes)), dtype=np.float32)
+            for j, column in enumerate(codes.T.astype(np.intp)):
+                sims += np.take(tables[j], column, axis=1)
+            return sims
+
+        return score
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"centroids": self.centroids}
+
+    def load_state(self, state):
+        self.centroids = state["centroids"]
+        self.n_subspaces, self.n_centroids = self.centroids.shape[:2]
+
+
+QUANTIZERS = {
+    ScalarQuantizer.kind: ScalarQuantizer,
+    ProductQuantizer.kind: ProductQuantizer,
+}
+
+
+def make_quantizer(kind: str, **params):
+    if kind not in QUANTIZERS:
+        raise ValueError(f"Unknown quantization '{kind}', expected one of: {', '.join(QUANTIZERS)}.")
+    if kind == ScalarQuantizer.kind:
+        return ScalarQuantizer()
+    return ProductQuantizer(**params)
+
+
+def save_quantizer(path: str, quantizer):
+    with open(path, "wb") as f:
+        np.savez(f, kind=np.array(quantizer.kind), **quantizer.state())
+
+
+def load_quantizer(path: str, **params):
+    with np.load(path) as data:
+        quantizer = make_quantizer(str(data["kind"]), **params)
+        quantizer.load_state({key: data[key] for key in data.files if key != "kind"})
+    return quantizer
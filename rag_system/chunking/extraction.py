@@ -0,0 +1,243 @@
+import pymupdf.layout
+import pymupdf4llm
+import pymupdf
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+# Bump when the text produced for a page changes, so stored extractions are not reused.
+EXTRACTION_VERSION = 1
+
+
+def extractor_version() -> str:
+    return f"v{EXTRACTION_VERSION}-pymupdf4llm{getattr(pymupdf4llm, '__version__', 'unknown')}"
+
+
+def file_md5(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Each worker process keeps the PDF it is working on open between page ranges.
+_open_document = {"key": None, "doc": None}
+
+
+def _worker_document(pdf_path: str):
+    stat = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+    if _open_document["key"] != key:
+        if _open_document["doc"] is not None:
+            _open_document["doc"].close()
+        _open_document["doc"] = pymupdf.open(pdf_path)
+        _open_document["key"] = key
+    return _open_document["doc"]
+
+
+def _layout_text(page_data: Dict) -> str:
+    lines_output = []
+    for ft in page_data.get("fulltext", []):
+        for line in ft.get("lines", []):
+            span_texts = [s.get("text", "") for s in line.get("spans", [])]
+            line_text = "".join(span_texts).strip()
+            if line_text:
+                lines_output.append(line_text)
+    return "\n".join(lines_output)
+
+
+def _layout_pages(doc, page_numbers: List[int]) -> List[Dict]:
+    data = json.loads(pymupdf4llm.to_json(doc, pages=page_numbers, header=False, footer=False))
+    pages = data["pages"]
+    if len(pages) != len(page_numbers):
+        raise ValueError(f"layout returned {len(pages)} pages for {len(page_numbers)} requested")
+    return pages
+
+
+def extract_page_range(pdf_path: str, start: int, end: int, doc=None) -> List[Dict]:
+    # Layout analysis runs once over the whole range; if it fails, each page is retried alone
+    # and, failing that, falls back to its raw text.
+    doc = doc if doc is not None else _worker_document(pdf_path)
+
+    raw_texts = {}
+    for page_num in range(start, end):
+        raw_text = doc[page_num].get_text().strip()
+        if raw_text:
+            raw_texts[page_num] = raw_text
+
+    page_numbers = list(raw_texts)
+    if not page_numbers:
+        return []
+
+    try:
+        layouts = dict(zip(page_numbers, _layout_pages(doc, page_numbers)))
+    except Exception:
+        layouts = {}
+        for page_num in page_numbers:
+            try:
+                layouts[page_num] = _layout_pages(doc, [page_num])[0]
+            except Exception as e:
+                print(f"[WARN] Falha extraindo layout da página {page_num} ({pdf_path}): {e}")
+
+    pages_text = []
+    for page_num in page_numbers:
+        layout_text = _layout_text(layouts[page_num]) if page_num in layouts else ""
+        pages_text.append({
+            'page_number': page_num,
+            'text': layout_text or raw_texts[page_num]
+        })
+    return pages_text
+
+
+def pdf_metadata(doc, pdf_path: str) -> Dict:
+    meta = doc.metadata
+    return {
+        "title": meta.get("title"),
+        "author": meta.get("author"),
+        "creationDate": meta.get("creationDate"),
+        "modDate": meta.get("modDate"),
+        "page_count": doc.page_count,
+        "pdf_name": os.path.basename(pdf_path)
+    }
+
+
+class PDFExtractor:
+    # Opens a PDF once for its metadata and page count, then runs layout analysis over
+    # ranges of `pages_per_task` pages in a process pool. Pages are yielded in order as
+    # soon as their range is done. max_workers=0 extracts in the calling process.
+    # With a page_store, extract() returns stored pages for PDFs whose content was
+    # already laid out by the same extractor version, and stores new extractions.
+
+    def __init__(self, max_workers: Optional[int] = None, pages_per_task: int = 16, page_store=None):
+        self.max_workers = max_workers if max_workers is not None else max(1, (os.cpu_count() or 2) - 1)
+        self.pages_per_task = max(1, pages_per_task)
+        self.page_store = page_store
+        self.last_stats: Dict = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # Spawned, not forked: the API process already runs torch threads, and forking a
+        # multi-threaded process can deadlock the child.
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        # A worker died (e.g. killed by the OOM killer); the next PDF gets a fresh pool.
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def close(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def _pooled_ranges(self, pdf_path: str, ranges: List[Tuple[int, int]], doc) -> Iterator[List[Dict]]:
+        # Ranges lost to a broken pool are extracted in this process instead.
+        pool = self._executor()
+        try:
+            futures = [pool.submit(extract_page_range, pdf_path, start, end) for start, end in ranges]
+        except BrokenProcessPool:
+            futures = [None] * len(ranges)
+
+        broken = False
+        for (start, end), future in zip(ranges, futures):
+            try:
+                if future is None:
+                    raise BrokenProcessPool("pool was already broken")
+                yield future.result()
+            except BrokenProcessPool as e:
+                if not broken:
+                    print(f"[WARN] Pool de extração quebrou em {os.path.basename(pdf_path)} ({e}), "
+                          f"extraindo as páginas restantes neste processo.")
+                    self._discard_pool(pool)
+                    broken = True
+                yield extract_page_range(pdf_path, start, end, doc=doc)
+
+    def _ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        return [
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+
+    def iter_pages(self, pdf_path: str, doc=None) -> Iterator[Dict]:
+        own_doc = doc is None
+        doc = pymupdf.open(pdf_path) if own_doc else doc
+        started = time.perf_counter()
+        n_pages = 0
+
+        try:
+            ranges = self._ranges(doc.page_count)
+            if self.max_workers <= 0 or len(ranges) <= 1:
+                results = (extract_page_range(pdf_path, start, end, doc=doc) for start, end in ranges)
+            else:
+                results = self._pooled_ranges(pdf_path, ranges, doc)
+
+            for pages in results:
+                for page in pages:
+                    n_pages += 1
+                    yield page
+        finally:
+            if own_doc:
+                doc.close()
+
+            elapsed = time.perf_counter() - started
+            self.last_stats = {
+                "pdf_name": os.path.basename(pdf_path),
+                "pages": n_pages,
+                "seconds": elapsed,
+                "pages_per_second": n_pages / elapsed if elapsed else 0.0,
+                "cached": False
+            }
+            print(f"[extract] {self.last_stats['pdf_name']}: {n_pages} páginas em {elapsed:.2f}s "
+                  f"({self.last_stats['pages_per_second']:.1f} páginas/s)")
+
+    def extract(self, pdf_path: str, file_hash: Optional[str] = None) -> Tuple[List[Dict], Dict]:
+        # Pages and PDF metadata from a single open of the file.
+        if self.page_store is not None:
+            started = time.perf_counter()
+            file_hash = file_hash or file_md5(pdf_path)
+            stored = self.page_store.get(file_hash, extractor_version())
+            if stored is not None:
+                pages, metadata = stored
+                elapsed = time.perf_counter() - started
+                self.last_stats = {
+                    "pdf_name": os.path.basename(pdf_path),
+                    "pages": len(pages),
+                    "seconds": elapsed,
+                    "pages_per_second": len(pages) / elapsed if elapsed else 0.0,
+                    "cached": True
+                }
+                return pages, dict(metadata, pdf_name=os.path.basename(pdf_path))
+
+        with pymupdf.open(pdf_path) as doc:
+            metadata = pdf_metadata(doc, pdf_path)
+            pages = list(self.iter_pages(pdf_path, doc=doc))
+
+        if self.page_store is not None:
+            self.page_store.put(file_hash, extractor_version(), pages, metadata)
+        return pages, metadata
+
+
+_default_extractor: Optional[PDFExtractor] = None
+
+
+def default_extractor() -> PDFExtractor:
+    global _default_extractor
+    if _default_extractor is None:
+        _default_extractor = PDFExtractor()
+    return _default_extractor
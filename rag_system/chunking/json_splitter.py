@@ -1,62 +1,18 @@
-import pymupdf.layout
-import pymupdf4llm
 import pymupdf
 from langchain_text_splitters import TokenTextSplitter
 from langchain_experimental.text_splitter import SemanticChunker
 from typing import List, Tuple, Dict
-import json 
 import os
+from rag_system.chunking.extraction import PDFExtractor, default_extractor, pdf_metadata
 from rag_system.chunking.section_classifier import SectionClassifier
+from rag_system.chunking.section_labeler import ChunkSectionLabeler
+from rag_system.utils.embedding_cache import EmbeddingCache, encode_chunks
+from rag_system.utils.token_counts import chunk_length_metadata
 from main.generator import OllamaGenerator
 
-def extract_text_from_json(pdf_path: str) -> List[Dict]:
-
-    doc = pymupdf.open(pdf_path)
-
-    pages_text = []
-
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-
-        raw_text = page.get_text().strip()
-        if not raw_text:
-            continue
-
-        try:
-            json_str = pymupdf4llm.to_json(
-                doc,
-                pages=[page_num],
-                header=False,
-                footer=False
-            )
-        except Exception as e:
-            print(f"[WARN] Falha extraindo layout da página {page_num} ({pdf_path}): {e}")
-            pages_text.append({
-                'page_number': page_num,
-                'text': raw_text
-            })
-            continue
-
-        data = json.loads(json_str)
-
-        lines_output = []
-        fulltext = data["pages"][0].get("fulltext", [])
-
-        for ft in fulltext:
-            for line in ft.get("lines", []):
-                span_texts = [s.get("text", "") for s in line.get("spans", [])]
-                line_text = "".join(span_texts).strip()
-                if line_text:
-                    lines_output.append(line_text)
-
-        final_text = "\n".join(lines_output) if lines_output else raw_text
-
-        pages_text.append({
-            'page_number': page_num,
-            'text': final_text
-        })
-
-    return pages_text
+def extract_text_from_json(pdf_path: str, extractor: PDFExtractor = None) -> List[Dict]:
+    extractor = extractor or default_extractor()
+    return list(extractor.iter_pages(pdf_path))
 
 def clean_text(t: str) -> str:
     t = t.replace("\r", "")
@@ -90,19 +46,21 @@ def merge_small_chunks(chunks: List[str], min_chars: int = 300) -> List[str]:
 
 class RecursivePDFChunker:
 
-    def __init__(self, semantical_model, chunk_size: int = 600, chunk_overlap: int = 80):
+    def __init__(self, semantical_model, chunk_size: int = 600, chunk_overlap: int = 80, token_encoding: str = "cl100k_base",
+                 extractor: PDFExtractor = None, embedding_cache: EmbeddingCache = None):
         self.semantical_model = semantical_model
-        self.splitter = TokenTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, encoding_name="cl100k_base")
+        self.extractor = extractor or default_extractor()
+        self.embedding_cache = embedding_cache
+        self.token_encoding = token_encoding
+        self.splitter = TokenTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, encoding_name=token_encoding)
 
     def run(self, pdf_path: str):
 
-        pages = extract_text_from_json(pdf_path)
+        pages, metadata_pdf = self.extractor.extract(pdf_path)
 
         all_text = []
         page_mapping = []
 
-
-        metadata_pdf = extract_pdf_metadata(pdf_path)
         for page in pages:
             all_text.append(page['text'])
             page_mapping.append({'page_number': page['page_number']})
@@ -112,11 +70,12 @@ class RecursivePDFChunker:
         docs = self.splitter.create_documents([full_text])
         chunks = [d.page_content for d in docs]
 
-        embeddings = self.semantical_model.encode(chunks, convert_to_tensor=True)
+        embeddings = encode_chunks(self.semantical_model, chunks, self.embedding_cache)
 
         chunk_metadata = []
         num_pages = len(page_mapping)
         chunks_per_page = max(1, len(chunks) // num_pages)
+        lengths = chunk_length_metadata(chunks, self.token_encoding)
 
         for i, ch in enumerate(chunks):
             page_idx = min(i // chunks_per_page, num_pages - 1)
@@ -124,6 +83,7 @@ class RecursivePDFChunker:
                 'page_number': page_mapping[page_idx]['page_number']
             }
             meta.update(metadata_pdf)
+            meta.update(lengths[i])
             chunk_metadata.append(meta)
 
         return chunks, embeddings, chunk_metadata
@@ -131,14 +91,20 @@ class RecursivePDFChunker:
     
 class SemanticPDFChunker:
 
-    def __init__(self, semantical_model=None):
+    def __init__(self, semantical_model=None, token_encoding: str = "cl100k_base", extractor: PDFExtractor = None,
+                 section_labeler: ChunkSectionLabeler = None, embedding_cache: EmbeddingCache = None):
         self.semantical_model = semantical_model
+        self.extractor = extractor or default_extractor()
+        self.embedding_cache = embedding_cache
+        self.section_labeler = section_labeler
+        self.token_encoding = token_encoding
         
         if not self.semantical_model is None:
             self.splitter = SemanticChunker(
-                SentenceTransformerEmbeddingsAdapter(semantical_model)
+                SentenceTransformerEmbeddingsAdapter(semantical_model, embedding_cache)
             )
-            self.section_classifier = SectionClassifier(semantical_model)
+            if section_labeler is None:
+                self.section_classifier = SectionClassifier(semantical_model, embedding_cache=embedding_cache)
 
     def _classify_chunk_with_llm(self, chunk_text: str, llm:OllamaGenerator = None) -> str:
         if not llm:
@@ -157,13 +123,22 @@ class SemanticPDFChunker:
             return None
 
     def run(self, pdf_path: str, llm:OllamaGenerator=OllamaGenerator()) -> Tuple[List[str], any, List[Dict]]:
-        pages = extract_text_from_json(pdf_path)
-        metadata_pdf = extract_pdf_metadata(pdf_path)
+        pages, metadata_pdf = self.extractor.extract(pdf_path)
 
         print("-----------------------------------------------------------------------------", metadata_pdf)
+        chunks, page_numbers = self.split_pages(pages)
+        sections = self.classify_chunks(chunks, llm=llm)
+        metadata = self.build_metadata(pdf_path, metadata_pdf, chunks, page_numbers, sections)
+
+        embeddings = encode_chunks(self.semantical_model, chunks, self.embedding_cache)
+
+        return chunks, embeddings, metadata
+
+    # The steps of run(), also used as separate stages by the ingestion pipeline.
+
+    def split_pages(self, pages: List[Dict]) -> Tuple[List[str], List[int]]:
         chunks = []
-        embeddings = []
-        metadata = []
+        page_numbers = []
 
         for page in pages:
             text = clean_text(page["text"])
@@ -171,26 +146,38 @@ class SemanticPDFChunker:
             if self._is_structural_noise(text):
                 continue
 
-            page_chunks = self._split_with_overlap(text)
-
-            for ch in page_chunks:
-                section = self._classify_chunk_with_llm(ch, llm=llm)
-                chunk_meta = {
-                    "page_number": page["page_number"],
-                    "section": section,
-                    "pdf_name": os.path.basename(pdf_path)
-                }
-                chunk_meta.update(metadata_pdf)
+            for ch in self._split_with_overlap(text):
                 chunks.append(ch)
-                metadata.append(chunk_meta)
-                print(f"Chunk added: Page {page['page_number']} | Section: {section}, Pdf: {os.path.basename(pdf_path)}")
+                page_numbers.append(page["page_number"])
 
-        embeddings = self.semantical_model.encode(
-            chunks,
-            convert_to_tensor=True
-        )
+        return chunks, page_numbers
 
-        return chunks, embeddings, metadata
+    def classify_chunks(self, chunks: List[str], llm:OllamaGenerator = None, executor=None) -> List[str]:
+        if self.section_labeler is not None:
+            return self.section_labeler.classify(chunks, llm=llm)
+
+        classify = lambda ch: self._classify_chunk_with_llm(ch, llm=llm)
+        if executor is None:
+            return [classify(ch) for ch in chunks]
+        return list(executor.map(classify, chunks))
+
+    def build_metadata(self, pdf_path: str, metadata_pdf: Dict, chunks: List[str], page_numbers: List[int],
+                       sections: List[str]) -> List[Dict]:
+        metadata = []
+        lengths = chunk_length_metadata(chunks, self.token_encoding)
+
+        for page_number, section, chunk_lengths in zip(page_numbers, sections, lengths):
+            chunk_meta = {
+                "page_number": page_number,
+                "section": section,
+                "pdf_name": os.path.basename(pdf_path)
+            }
+            chunk_meta.update(metadata_pdf)
+            chunk_meta.update(chunk_lengths)
+            metadata.append(chunk_meta)
+            print(f"Chunk added: Page {page_number} | Section: {section}, Pdf: {os.path.basename(pdf_path)}")
+
+        return metadata
     
     def _is_structural_noise(self, text: str) -> bool:
         t = text.lower()
@@ -225,10 +212,13 @@ class SemanticPDFChunker:
 
         return chunks
 class SentenceTransformerEmbeddingsAdapter:
-    def __init__(self, model):
+    def __init__(self, model, embedding_cache: EmbeddingCache = None):
         self.model = model
+        self.embedding_cache = embedding_cache
 
     def embed_documents(self, texts):
+        if self.embedding_cache is not None:
+            return self.embedding_cache.encode(self.model, texts).tolist()
         embeddings = self.model.encode(texts, convert_to_numpy=True)
         return embeddings.tolist()
 
@@ -237,13 +227,5 @@ class SentenceTransformerEmbeddingsAdapter:
         return embedding.tolist()
     
 def extract_pdf_metadata(pdf_path):
-    doc = pymupdf.open(pdf_path)
-    meta = doc.metadata
-    return {
-        "title": meta.get("title"),
-        "author": meta.get("author"),
-        "creationDate": meta.get("creationDate"),
-        "modDate": meta.get("modDate"),
-        "page_count": doc.page_count,
-        "pdf_name": os.path.basename(pdf_path)
-    }
+    with pymupdf.open(pdf_path) as doc:
+        return pdf_metadata(doc, pdf_path)
@@ -0,0 +1,228 @@
+import os
+import pickle
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from rag_system.retrieval.bm25 import fold_accents
+
+INDEX_FORMAT_VERSION = 1
+
+_WORD_PATTERN = re.compile(r"\w+")
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def shingle_hashes(text: str, size: int = 5) -> np.ndarray:
+    words = _WORD_PATTERN.findall(fold_accents((text or "").lower()))
+    if len(words) < size:
+        grams = {" ".join(words)} if words else set()
+    else:
+        grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(gram.encode("utf8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+class NearDuplicateIndex:
+    # MinHash signatures of word shingles, banded for LSH, over every chunk ingested so far.
+    # The first chunk of a near-duplicate group is its canonical chunk (the one stored in the
+    # vector DB); later ones become aliases and are only recorded in the canonical's
+    # provenance, so every source PDF that contained the text stays known (the pipeline copies
+    # the other sources into the canonical row's also_in metadata).
+    #   mode="collapse": aliases are neither embedded nor stored.
+    #   mode="flag":     aliases are stored with a duplicate_of metadata field.
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        num_perm: int = 128,
+        bands: int = 32,
+        shingle_size: int = 5,
+        threshold: float = 0.8,
+        mode: str = "collapse",
+        seed: int = 1
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands.")
+        if mode not in ("collapse", "flag"):
+            raise ValueError(f"Unknown near-duplicate mode '{mode}', expected 'collapse' or 'flag'.")
+
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.mode = mode
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+        # a < 2^31 and hashes < 2^32 keep a * x + b inside uint64.
+        self._a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, num_perm, dtype=np.uint64)
+
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.provenance: Dict[str, List[Dict]] = {}
+        self.alias_of: Dict[str, str] = {}
+        self.duplicates_found = 0
+        self._buckets: Dict[Tuple[int, bytes], List[str]] = {}
+        self._lock = threading.RLock()
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        hashes = shingle_hashes(text, self.shingle_size)
+        if not len(hashes):
+            return None
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME
+        return (permuted.min(axis=1) & 0xFFFFFFFF).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(band, rows.tobytes()) for band, rows in enumerate(signature.reshape(self.bands, -1))]
+
+    def _index(self, chunk_id: str, signature: np.ndarray):
+        self.signatures[chunk_id] = signature
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(chunk_id)
+
+    def _unindex(self, chunk_id: str):
+        signature = self.signatures.pop(chunk_id, None)
+        self.provenance.pop(chunk_id, None)
+        if signature is None:
+            return
+        for key in self._band_keys(signature):
+            bucket = self._buckets.get(key, [])
+            if chunk_id in bucket:
+                bucket.remove(chunk_id)
+            if not bucket:
+                self._buckets.pop(key, None)
+
+    def match(self, signature: np.ndarray, exclude: Optional[Set[str]] = None) -> Optional[Tuple[str, float]]:
+        # Best canonical chunk sharing a band with the signature, if its estimated
+        # Jaccard similarity reaches the threshold.
+        candidates = {chunk_id for key in self._band_keys(signature) for chunk_id in self._buckets.get(key, ())}
+        candidates -= exclude or set()
+        best, best_similarity = None, self.threshold
+        for chunk_id in candidates:
+            similarity = float(np.mean(self.signatures[chunk_id] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = chunk_id, similarity
+        return (best, best_similarity) if best is not None else None
+
+    def assign(self, chunk_id: str, text: str, provenance: Dict, exclude: Optional[Set[str]] = None) -> Optional[str]:
+        # Returns the canonical chunk id if chunk_id is a near-duplicate; otherwise registers
+        # chunk_id as a canonical chunk and returns None. Canonical chunks in exclude (the
+        # previous version of the same file, about to be released) are never matched.
+        with self._lock:
+            if chunk_id in self.alias_of:
+                canonical = self.alias_of[chunk_id]
+                return canonical if canonical != chunk_id else None
+
+            signature = self.signature(text)
+            if signature is None:
+                return None
+
+            entry = dict(provenance, chunk_id=chunk_id)
+            found = self.match(signature, exclude)
+            if found is not None:
+                canonical = found[0]
+                self.alias_of[chunk_id] = canonical
+                self.provenance[canonical].append(entry)
+                self.duplicates_found += 1
+                return canonical
+
+            self._index(chunk_id, signature)
+            self.alias_of[chunk_id] = chunk_id
+            self.provenance[chunk_id] = [entry]
+            return None
+
+    def release(self, chunk_ids: Iterable[str], rekey: bool = False) -> Dict:
+        # Forgets chunks of a removed/replaced file (or of one that failed to ingest). Returns:
+        #   kept:    canonical ids among chunk_ids that other sources still contain, mapped to
+        #            the provenance entry that now owns them (their row must stay in the DB);
+        #   renamed: with rekey=True, such canonicals are instead renamed to their new owner's
+        #            chunk id (old id -> new id), for when that chunk has or will get its own row;
+        #   dropped: canonical ids not in chunk_ids whose last source went away;
+        #   changed: canonical ids that still exist but lost some sources.
+        removed = set(chunk_ids)
+        result = {"kept": {}, "renamed": {}, "dropped": [], "changed": []}
+        with self._lock:
+            touched = {self.alias_of.pop(chunk_id) for chunk_id in removed if chunk_id in self.alias_of}
+            for canonical in touched:
+                entries = [entry for entry in self.provenance.get(canonical, []) if entry["chunk_id"] not in removed]
+                if not entries:
+                    self._unindex(canonical)
+                    self.alias_of.pop(canonical, None)
+                    if canonical not in removed:
+                        result["dropped"].append(canonical)
+                    continue
+
+                self.provenance[canonical] = entries
+                if canonical not in removed:
+                    result["changed"].append(canonical)
+                elif rekey:
+                    result["renamed"][canonical] = self._rename(canonical, entries[0]["chunk_id"])
+                else:
+                    result["kept"][canonical] = entries[0]
+        return result
+
+    def _rename(self, old_id: str, new_id: str) -> str:
+        signature = self.signatures[old_id]
+        entries = self.provenance[old_id]
+        self._unindex(old_id)
+        self._index(new_id, signature)
+        self.provenance[new_id] = entries
+        for entry in entries:
+            self.alias_of[entry["chunk_id"]] = new_id
+        return new_id
+
+    def sources(self, chunk_id: str) -> List[Dict]:
+        canonical = self.alias_of.get(chunk_id, chunk_id)
+        return list(self.provenance.get(canonical, []))
+
+    def stats(self) -> Dict:
+        return {
+            "canonical_chunks": len(self.signatures),
+            "aliases": sum(len(entries) for entries in self.provenance.values()) - len(self.signatures),
+            "duplicates_found": self.duplicates_found,
+        }
+
+    def save(self):
+        if not self.path:
+            return
+
+        with self._lock:
+            state = {
+                "format_version": INDEX_FORMAT_VERSION,
+                "params": self._params(),
+                "signatures": self.signatures,
+                "provenance": self.provenance,
+                "alias_of": self.alias_of,
+            }
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+
+    def _params(self) -> Dict:
+        return {"num_perm": self.num_perm, "bands": self.bands, "shingle_size": self.shingle_size, "seed": self.seed}
+
+    def load(self):
+        with open(self.path, "rb") as f:
+            state = pickle.load(f)
+
+        if state.get("format_version") != INDEX_FORMAT_VERSION or state.get("params") != self._params():
+            print(f"[WARN] Índice de quase-duplicatas incompatível ({self.path}), começando vazio.")
+            return
+
+        self.provenance = state["provenance"]
+        self.alias_of = state["alias_of"]
+        self._buckets = {}
+        self.signatures = {}
+        for chunk_id, signature in state["signatures"].items():
+            self._index(chunk_id, signature)
@@ -0,0 +1,113 @@
+"""Pre-extracts the pages of every PDF in a directory into the page store.
+
+    python -m rag_system.chunking.page_store data/uploads
+    python -m rag_system.chunking.page_store data/uploads --store cache/extracted_pages --workers 4
+
+PDFs already stored for the current extractor version are only hashed.
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class PageStore:
+    # Extracted pages and PDF metadata on disk, one gzip JSONL file per
+    # (file content hash, extractor version): a header line with the metadata,
+    # then one line per page. Renaming or moving a PDF keeps its entry valid.
+
+    def __init__(self, path: str = "cache/extracted_pages"):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, file_hash: str, version: str) -> str:
+        slug = re.sub(r"[^\w\-.]+", "_", version)
+        return os.path.join(self.path, f"{file_hash}.{slug}.jsonl.gz")
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return os.path.exists(self._file(*key))
+
+    def get(self, file_hash: str, version: str) -> Optional[Tuple[List[Dict], Dict]]:
+        path = self._file(file_hash, version)
+        try:
+            with gzip.open(path, "rt", encoding="utf8") as f:
+                header = json.loads(f.readline())
+                pages = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, EOFError, ValueError) as e:
+            print(f"[WARN] Entrada corrompida no cache de páginas ({path}): {e}")
+            self.misses += 1
+            return None
+
+        if len(pages) != header.get("n_pages"):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pages, header["metadata"]
+
+    def put(self, file_hash: str, version: str, pages: List[Dict], metadata: Dict):
+        path = self._file(file_hash, version)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf8", compresslevel=6) as f:
+            f.write(json.dumps({"metadata": metadata, "version": version, "n_pages": len(pages)}, ensure_ascii=False) + "\n")
+            for page in pages:
+                f.write(json.dumps(page, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+
+    def stats(self) -> Dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": sum(
+            1 for name in os.listdir(self.path) if name.endswith(".jsonl.gz")
+        )}
+
+
+def main():
+    from rag_system.chunking.extraction import PDFExtractor, extractor_version, file_md5
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="directory with the PDFs (searched recursively)")
+    parser.add_argument("--store", default="cache/extracted_pages")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: cpu_count - 1)")
+    parser.add_argument("--pages-per-task", type=int, default=16)
+    args = parser.parse_args()
+
+    store = PageStore(args.store)
+    extractor = PDFExtractor(max_workers=args.workers, pages_per_task=args.pages_per_task, page_store=store)
+    version = extractor_version()
+
+    pdf_paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(args.directory)
+        for name in names if name.lower().endswith(".pdf")
+    )
+
+    started = time.perf_counter()
+    cached, extracted, pages, failed = 0, 0, 0, []
+    try:
+        for pdf_path in pdf_paths:
+            try:
+                file_hash = file_md5(pdf_path)
+                if (file_hash, version) in store:
+                    cached += 1
+                    continue
+                pages += len(extractor.extract(pdf_path, file_hash=file_hash)[0])
+                extracted += 1
+            except Exception as e:
+                print(f"[WARN] Falha extraindo {pdf_path}: {e}")
+                failed.append(pdf_path)
+    finally:
+        extractor.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"{len(pdf_paths)} PDFs em {elapsed:.1f}s: {extracted} extraídos ({pages} páginas), "
+          f"{cached} já no cache, {len(failed)} com falha (versão do extrator: {version})")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,21 +10,57 @@ SECTION_LABELS = {
 }
 
 class SectionClassifier:
-    def __init__(self, semantical_model):
+    def __init__(self, semantical_model, embedding_cache=None):
         self.model = semantical_model
+        self.embedding_cache = embedding_cache
         self.labels = list(SECTION_LABELS.keys())
-        self.label_embeddings = self.model.encode(
-            list(SECTION_LABELS.values()),
-            convert_to_tensor=True
-        )
+        self.label_embeddings = self._encode(list(SECTION_LABELS.values()))
 
-    def classify(self, chunk_text: str) -> str:
-        chunk_emb = self.model.encode(chunk_text, convert_to_tensor=True)
+    def _encode(self, texts):
+        if self.embedding_cache is not None:
+            return torch.from_numpy(self.embedding_cache.encode(self.model, texts))
+        return self.model.encode(texts, convert_to_tensor=True)
+
+    def _similarities(self, chunk_text: str, embedding=None):
+        # embedding: the text's vector when the caller already encoded it.
+        if embedding is None:
+            chunk_emb = self._encode([chunk_text])[0]
+        else:
+            chunk_emb = torch.as_tensor(embedding, dtype=self.label_embeddings.dtype)
+        chunk_emb = chunk_emb.to(self.label_embeddings.device)
 
-        sims = F.cosine_similarity(
+        return F.cosine_similarity(
             chunk_emb.unsqueeze(0),
             self.label_embeddings
         )
 
+    def classify(self, chunk_text: str) -> str:
+        sims = self._similarities(chunk_text)
+
         best_idx = torch.argmax(sims).item()
-        return self.labels[best_idx]
\ No newline at end of file
+        return self.labels[best_idx]
+
+    def classify_with_margin(self, chunk_text: str, embedding=None):
+        sims = self._similarities(chunk_text, embedding)
+
+        top = torch.topk(sims, k=min(2, len(self.labels)))
+        best_idx = top.indices[0].item()
+        margin = (top.values[0] - top.values[1]).item() if len(top.values) > 1 else 1.0
+        return self.labels[best_idx], margin
+
+    def classify_batch(self, chunk_texts, batch_size: int = 64):
+        # Encodes chunks batch_size at a time against the precomputed label embeddings;
+        # returns (label, top-1 minus top-2 margin) per chunk.
+        if not chunk_texts:
+            return []
+
+        results = []
+        for start in range(0, len(chunk_texts), batch_size):
+            chunk_embs = self._encode(list(chunk_texts[start:start + batch_size])).to(self.label_embeddings.device)
+            sims = F.normalize(chunk_embs, dim=-1) @ F.normalize(self.label_embeddings, dim=-1).T
+
+            top = torch.topk(sims, k=min(2, len(self.labels)), dim=1)
+            for values, indices in zip(top.values.tolist(), top.indices.tolist()):
+                margin = values[0] - values[1] if len(values) > 1 else 1.0
+                results.append((self.labels[indices[0]], margin))
+        return results
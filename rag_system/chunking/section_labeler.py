@@ -0,0 +1,134 @@
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from rag_system.chunking.section_classifier import SECTION_LABELS, SectionClassifier
+from rag_system.utils.embedding_cache import text_key
+
+_ANSWER_LINE = re.compile(r"^\W*(\d+)\W+([A-Za-zÀ-ÿ]+)")
+
+
+class ChunkSectionLabeler:
+    # Section labels for ingested chunks:
+    #   1. persistent cache keyed by the chunk-text hash (re-ingestion never reclassifies),
+    #   2. batched embedding classifier against the precomputed label embeddings,
+    #   3. optional LLM pass only for chunks whose classifier margin is below min_margin,
+    #      llm_batch_size chunks per prompt and at most llm_concurrency prompts in flight.
+    # Only confident classifier labels and LLM answers are cached: an uncertain chunk the LLM
+    # did not label (no llm, use_llm=False or a failed call) is classified again next time.
+
+    def __init__(
+        self,
+        semantical_model,
+        cache_path: Optional[str] = None,
+        min_margin: float = 0.05,
+        use_llm: bool = True,
+        llm_batch_size: int = 8,
+        llm_concurrency: int = 2,
+        classifier_batch_size: int = 64,
+        embedding_cache=None
+    ):
+        self.classifier = SectionClassifier(semantical_model, embedding_cache=embedding_cache)
+        self.cache_path = cache_path
+        self.min_margin = min_margin
+        self.use_llm = use_llm
+        self.llm_batch_size = max(1, llm_batch_size)
+        self.llm_concurrency = max(1, llm_concurrency)
+        self.classifier_batch_size = classifier_batch_size
+
+        self.tier_counts: Dict[str, int] = {"cache": 0, "classifier": 0, "llm": 0}
+        self._cache: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        with open(self.cache_path, "r", encoding="utf8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._cache[entry["key"]] = entry["section"]
+
+    def _store(self, entries: Dict[str, Tuple[str, str]]):
+        with self._lock:
+            for key, (section, _) in entries.items():
+                self._cache[key] = section
+            if not self.cache_path:
+                return
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            with open(self.cache_path, "a", encoding="utf8") as f:
+                for key, (section, tier) in entries.items():
+                    f.write(json.dumps({"key": key, "section": section, "tier": tier}, ensure_ascii=False) + "\n")
+
+    def _prompt(self, chunks: List[str]) -> str:
+        numbered = "\n\n".join(f"[{i}]\n{chunk}" for i, chunk in enumerate(chunks, start=1))
+        return (
+            "Classifique a seção acadêmica de cada trecho abaixo em uma das opções: "
+            + ", ".join(SECTION_LABELS) +
+            "\nResponda apenas com uma linha por trecho, no formato <número>: <seção>.\n\n" + numbered
+        )
+
+    def _ask_llm(self, chunks: List[str], llm) -> List[Optional[str]]:
+        try:
+            response = str(llm.generate(self._prompt(chunks)))
+        except Exception as e:
+            print(f"[WARN] Falha classificando {len(chunks)} trechos com o LLM: {e}")
+            return [None] * len(chunks)
+
+        answers: List[Optional[str]] = [None] * len(chunks)
+        for line in response.splitlines():
+            match = _ANSWER_LINE.match(line.strip())
+            if not match:
+                continue
+            index, label = int(match.group(1)) - 1, match.group(2).lower()
+            if 0 <= index < len(chunks) and label in SECTION_LABELS:
+                answers[index] = label
+        return answers
+
+    def classify(self, chunks: List[str], llm=None) -> List[str]:
+        keys = [text_key(chunk) for chunk in chunks]
+        sections: List[Optional[str]] = [self._cache.get(key) for key in keys]
+
+        missing: Dict[str, List[int]] = {}
+        for i, section in enumerate(sections):
+            if section is None:
+                missing.setdefault(keys[i], []).append(i)
+        self.tier_counts["cache"] += len(chunks) - sum(len(positions) for positions in missing.values())
+        if not missing:
+            return sections
+
+        miss_keys = list(missing)
+        miss_texts = [chunks[missing[key][0]] for key in miss_keys]
+        labeled = {
+            key: (label, margin)
+            for key, (label, margin) in zip(miss_keys, self.classifier.classify_batch(miss_texts, self.classifier_batch_size))
+        }
+
+        results = {key: (label, "classifier") for key, (label, _) in labeled.items()}
+
+        uncertain = [key for key in miss_keys if labeled[key][1] < self.min_margin]
+        if uncertain and self.use_llm and llm is not None:
+            text_of = dict(zip(miss_keys, miss_texts))
+            batches = [uncertain[i:i + self.llm_batch_size] for i in range(0, len(uncertain), self.llm_batch_size)]
+            with ThreadPoolExecutor(max_workers=self.llm_concurrency, thread_name_prefix="section-llm") as executor:
+                answers = executor.map(lambda batch: self._ask_llm([text_of[key] for key in batch], llm), batches)
+                for batch, batch_answers in zip(batches, answers):
+                    for key, answer in zip(batch, batch_answers):
+                        if answer:
+                            results[key] = (answer, "llm")
+
+        for key, (section, tier) in results.items():
+            self.tier_counts[tier] += len(missing[key])
+            for i in missing[key]:
+                sections[i] = section
+
+        unanswered = {key for key in uncertain if results[key][1] != "llm"}
+        self._store({key: result for key, result in results.items() if key not in unanswered})
+        return sections
+
+    def stats(self) -> Dict:
+        return {"cached": len(self._cache), "tiers": dict(self.tier_counts)}
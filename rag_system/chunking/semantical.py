@@ -4,6 +4,8 @@ rootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
 import unicodedata
 import re
 
+from rag_system.utils.embedding_cache import encode_chunks
+
 
 def dedupe_preserve_order(lines):
     out = []
@@ -20,8 +22,9 @@ def dedupe_text_block(text: str) -> str:
 
 
 class SemanticalChunker:    
-    def __init__(self, semantical_model):
+    def __init__(self, semantical_model, embedding_cache=None):
         self.semantical_model = semantical_model
+        self.embedding_cache = embedding_cache
     
     def run(
         self, 
@@ -85,6 +88,6 @@ class SemanticalChunker:
             else:
                 final_chunks.append(c)
 
-        embeddings = self.semantical_model.encode(final_chunks, convert_to_tensor=True)
+        embeddings = encode_chunks(self.semantical_model, final_chunks, self.embedding_cache)
         
         return final_chunks, embeddings
\ No newline at end of file
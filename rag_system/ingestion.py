@@ -0,0 +1,462 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from main.generator import OllamaGenerator
+from rag_system.chunking.extraction import file_md5
+from rag_system.chunking.near_duplicates import NearDuplicateIndex
+
+_DONE = object()
+
+
+class IngestionManifest:
+    # Persistent record of what has been ingested, keyed by content hash:
+    #   files:     filename -> {file_hash, size, mtime_ns}
+    #   documents: file_hash -> {source, ids}
+    # A file whose size and mtime match its entry is not even re-hashed.
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+        self.documents: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.documents = data.get("documents", {})
+
+    def check(self, path: str) -> Tuple[str, Optional[str], List[str]]:
+        # Returns (status, file_hash, stale_ids) with status "unchanged", "duplicate" or "new".
+        filename = os.path.basename(path)
+        stat = os.stat(path)
+        entry = self.files.get(filename)
+
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return "unchanged", entry["file_hash"], []
+
+        file_hash = file_md5(path)
+        with self._lock:
+            previous_hash = entry["file_hash"] if entry else None
+            if previous_hash == file_hash:
+                # Touched but identical.
+                self.files[filename] = {"file_hash": file_hash, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+                return "unchanged", file_hash, []
+
+            stale_ids = []
+            if previous_hash and not any(
+                other["file_hash"] == previous_hash for name, other in self.files.items() if name != filename
+            ):
+                stale_ids = list(self.documents.get(previous_hash, {}).get("ids", []))
+
+            if file_hash in self.documents:
+                # Same content already ingested under another name: only the old version goes.
+                self.files[filename] = {"file_hash": file_hash, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+                if stale_ids:
+                    self.documents.pop(previous_hash, None)
+                return "duplicate", file_hash, stale_ids
+
+            return "new", file_hash, stale_ids
+
+    def record(self, path: str, file_hash: str, ids: List[str]):
+        filename = os.path.basename(path)
+        stat = os.stat(path)
+        with self._lock:
+            previous = self.files.get(filename)
+            self.files[filename] = {"file_hash": file_hash, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            self.documents[file_hash] = {"source": filename, "ids": list(ids)}
+
+            if previous and previous["file_hash"] != file_hash and not any(
+                other["file_hash"] == previous["file_hash"] for other in self.files.values()
+            ):
+                self.documents.pop(previous["file_hash"], None)
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock:
+            data = {"files": self.files, "documents": self.documents}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class IngestionPipeline:
+    # Staged ingestion: extract -> chunk -> classify -> embed -> upsert. Stages are threads
+    # connected by bounded queues, so several PDFs are in flight at once: pages of one file
+    # are being laid out (in the extractor's process pool) while chunks of another wait on
+    # Ollama and a third is being embedded. Embedding and upserts are batched across files.
+    # With a near_duplicates index, chunks that nearly repeat one already in the collection
+    # are collapsed onto it before embedding (or only flagged, depending on its mode).
+
+    def __init__(
+        self,
+        vector_db,
+        chunker,
+        llm: Optional[OllamaGenerator] = None,
+        extract_workers: int = 2,
+        classify_workers: int = 4,
+        embed_batch_size: int = 256,
+        upsert_batch_size: int = 1024,
+        queue_size: int = 4,
+        manifest_path: Optional[str] = None,
+        near_duplicates: Optional[NearDuplicateIndex] = None
+    ):
+        self.vector_db = vector_db
+        self.chunker = chunker
+        self.llm = llm or OllamaGenerator()
+        self.extract_workers = max(1, extract_workers)
+        self.classify_workers = max(1, classify_workers)
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.queue_size = queue_size
+        self.manifest = IngestionManifest(manifest_path)
+        self.near_duplicates = near_duplicates
+
+    # --- stages -----------------------------------------------------------------------
+
+    def _extract(self, job: Dict) -> Dict:
+        job["pages"], job["pdf_metadata"] = self.chunker.extractor.extract(job["path"], file_hash=job["file_hash"])
+        return job
+
+    def _chunk(self, job: Dict) -> Dict:
+        job["chunks"], job["page_numbers"] = self.chunker.split_pages(job.pop("pages"))
+        return job
+
+    def _classify(self, job: Dict, executor) -> Dict:
+        sections = self.chunker.classify_chunks(job["chunks"], llm=self.llm, executor=executor)
+        job["metadata"] = self.chunker.build_metadata(
+            job["path"], job.pop("pdf_metadata"), job["chunks"], job.pop("page_numbers"), sections
+        )
+        return job
+
+    def _collapse(self, jobs: List[Dict]):
+        # Decides which chunks of each job are stored; runs in the single embed thread, so
+        # chunks of the same batch are matched against each other in order.
+        for job in jobs:
+            job["ids"] = [f"{job['filename']}_{job['file_hash']}_{i}" for i in range(len(job["chunks"]))]
+            job["stored"] = list(range(len(job["chunks"])))
+            if self.near_duplicates is None:
+                continue
+
+            # The previous version of this file is about to be released: matching its chunks
+            # would keep their old text under the new version.
+            previous_version = set(job["stale_ids"])
+            stored = []
+            for i, (chunk_id, chunk, meta) in enumerate(zip(job["ids"], job["chunks"], job["metadata"])):
+                meta = meta if isinstance(meta, dict) else {}
+                canonical = self.near_duplicates.assign(chunk_id, chunk, {
+                    "source": job["filename"],
+                    "file_hash": job["file_hash"],
+                    "page": meta.get("page", meta.get("page_number")),
+                    "pdf_name": meta.get("pdf_name")
+                }, exclude=previous_version)
+                if canonical is None or self.near_duplicates.mode == "flag":
+                    stored.append(i)
+            job["stored"] = stored
+
+    def _encode(self, texts: List[str]):
+        embedding_cache = getattr(self.chunker, "embedding_cache", None)
+        if not texts:
+            return []
+        if embedding_cache is not None:
+            return embedding_cache.encode(self.chunker.semantical_model, texts)
+        return self.chunker.semantical_model.encode(texts, convert_to_numpy=True)
+
+    def _embed(self, jobs: List[Dict]) -> List[Dict]:
+        self._collapse(jobs)
+        embeddings = self._encode([job["chunks"][i] for job in jobs for i in job["stored"]])
+
+        start = 0
+        for job in jobs:
+            job["embeddings"] = embeddings[start:start + len(job["stored"])]
+            start += len(job["stored"])
+        return jobs
+
+    def _upsert(self, jobs: List[Dict]):
+        ids, documents, embeddings, metadatas = [], [], [], []
+        canonicals = set()
+        for job in jobs:
+            filename = job["filename"]
+            stored = list(job["stored"])
+            vectors = np.asarray(job["embeddings"], dtype=np.float32).tolist()
+
+            duplicate_of = {}
+            if self.near_duplicates is not None:
+                # Read the index again: when the batch holding a canonical chunk failed, one of
+                # its collapsed copies took over the canonical role and now needs its own row.
+                current = {i: self.near_duplicates.alias_of.get(chunk_id) for i, chunk_id in enumerate(job["ids"])}
+                promoted = [i for i, canonical in current.items() if canonical == job["ids"][i] and i not in job["stored"]]
+                if promoted:
+                    stored += promoted
+                    job["stored"] = stored
+                    vectors += np.asarray(self._encode([job["chunks"][i] for i in promoted]), dtype=np.float32).tolist()
+                duplicate_of = {
+                    i: canonical for i, canonical in current.items()
+                    if canonical is not None and canonical != job["ids"][i]
+                }
+                canonicals.update(duplicate_of.values())
+
+            ids += [job["ids"][i] for i in stored]
+            documents += [job["chunks"][i] for i in stored]
+            embeddings += vectors
+
+            for i in stored:
+                meta = job["metadata"][i]
+                merged = dict(meta) if isinstance(meta, dict) else {}
+                if "page" not in merged and "page_number" in merged:
+                    merged["page"] = merged.get("page_number")
+                merged.update({
+                    "source": filename,
+                    "file_hash": job["file_hash"]
+                })
+                if i in duplicate_of:
+                    merged["duplicate_of"] = duplicate_of[i]
+                metadatas.append(merged)
+
+        if ids:
+            self.vector_db.add_embeddings(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+        # Canonical chunks that gained copies list the other sources in also_in.
+        self._refresh_rows({chunk_id: {} for chunk_id in canonicals})
+
+        # Chunks of the previous version of a replaced file go only once the new ones are in.
+        stale_ids = [doc_id for job in jobs for doc_id in job["stale_ids"]]
+        self._delete_stale(stale_ids)
+
+        # Collapsed chunk ids are recorded too, so replacing this file releases them.
+        for job in jobs:
+            self.manifest.record(job["path"], job["file_hash"], job["ids"])
+        self.manifest.save()
+        if self.near_duplicates is not None:
+            self.near_duplicates.save()
+
+    def _delete_stale(self, stale_ids: List[str]):
+        if not stale_ids:
+            return
+
+        if self.near_duplicates is not None:
+            # In flag mode every copy has its own row, so a canonical chunk whose file goes
+            # away hands its role (and id) to its first remaining copy.
+            released = self.near_duplicates.release(stale_ids, rekey=self.near_duplicates.mode == "flag")
+            updates = {chunk_id: {} for chunk_id in released["changed"]}
+            for chunk_id, owner in released["kept"].items():
+                updates[chunk_id] = {key: value for key, value in owner.items() if key != "chunk_id"}
+            for new_id in released["renamed"].values():
+                updates[new_id] = {"duplicate_of": None}
+                for entry in self.near_duplicates.sources(new_id):
+                    if entry["chunk_id"] != new_id:
+                        updates[entry["chunk_id"]] = {"duplicate_of": new_id}
+
+            self._refresh_rows(updates)
+            stale_ids = [doc_id for doc_id in stale_ids if doc_id not in released["kept"]] + released["dropped"]
+            self.near_duplicates.save()
+
+        self.vector_db.delete(ids=stale_ids)
+
+    def _refresh_rows(self, updates: Dict[str, Dict]):
+        # Rewrites the metadata of rows already in the collection (a None value removes the
+        # field). Canonical chunks whose text other PDFs also contain stay in the collection,
+        # labelled with their current owner and listing the other sources in also_in.
+        if not updates:
+            return
+
+        rows = self.vector_db.get(list(updates), include=["documents", "metadatas", "embeddings"])
+        if not rows["ids"]:
+            return
+
+        metadatas = []
+        for chunk_id, meta in zip(rows["ids"], rows["metadatas"]):
+            merged = dict(meta or {})
+            for key, value in updates[chunk_id].items():
+                if value is None:
+                    merged.pop(key, None)
+                else:
+                    merged[key] = value
+
+            merged.pop("also_in", None)
+            if chunk_id in self.near_duplicates.signatures:
+                also_in = {entry["source"] for entry in self.near_duplicates.sources(chunk_id)} - {merged.get("source")}
+                if also_in:
+                    merged["also_in"] = "|".join(sorted(also_in))
+            metadatas.append(merged)
+
+        self.vector_db.add_embeddings(
+            ids=rows["ids"], documents=rows["documents"], embeddings=rows["embeddings"], metadatas=metadatas
+        )
+
+    # --- plumbing ---------------------------------------------------------------------
+
+    @staticmethod
+    def _drain(inbox: queue.Queue, first, max_chunks: int) -> Tuple[List[Dict], bool]:
+        # Groups queued jobs into one batch of up to max_chunks chunks without waiting for more.
+        batch = [first]
+        size = len(first["chunks"])
+        while size < max_chunks:
+            try:
+                job = inbox.get_nowait()
+            except queue.Empty:
+                break
+            if job is _DONE:
+                return batch, True
+            batch.append(job)
+            size += len(job["chunks"])
+        return batch, False
+
+    def run(self, paths: Iterable[str]) -> Dict:
+        # The BM25 keyword index is pickled once at the end of the run, not after every batch.
+        with self.vector_db.bulk_writes():
+            return self._run(paths)
+
+    def _run(self, paths: Iterable[str]) -> Dict:
+        started = time.perf_counter()
+        paths = list(paths)
+
+        queues = {name: queue.Queue(maxsize=self.queue_size) for name in ("extract", "chunk", "classify", "embed", "upsert")}
+        failed: Dict[str, str] = {}
+        processed: List[str] = []
+        skipped: List[str] = []
+        queued: Dict[str, str] = {}
+        deferred: List[Dict] = []
+        total_chunks = [0]
+        collapsed_chunks = [0]
+        lock = threading.Lock()
+
+        def fail(job: Dict, error: Exception):
+            print(f"[ingest] {job['filename']}: {error}")
+            with lock:
+                failed[job["filename"]] = str(error)
+            if self.near_duplicates is not None and "ids" in job:
+                # Chunks of a file that never reached the DB cannot be canonical for others: a
+                # copy still waiting to be upserted takes over the role and gets stored instead.
+                self.near_duplicates.release(job["ids"], rekey=True)
+
+        def stage(name: str, fn, outbox: queue.Queue, workers: int = 1):
+            inbox = queues[name]
+            remaining = [workers]
+
+            def worker():
+                while True:
+                    job = inbox.get()
+                    if job is _DONE:
+                        inbox.put(_DONE)  # let the sibling workers see it too
+                        break
+                    try:
+                        outbox.put(fn(job))
+                    except Exception as e:
+                        fail(job, e)
+
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    outbox.put(_DONE)
+
+            return [threading.Thread(target=worker, name=f"ingest-{name}-{i}", daemon=True) for i in range(workers)]
+
+        def batched(name: str, fn, outbox: Optional[queue.Queue], max_chunks: int):
+            inbox = queues[name]
+
+            def worker():
+                done = False
+                while not done:
+                    first = inbox.get()
+                    if first is _DONE:
+                        break
+                    batch, done = self._drain(inbox, first, max_chunks)
+                    try:
+                        result = fn(batch)
+                        if outbox is not None:
+                            for job in result:
+                                outbox.put(job)
+                    except Exception as e:
+                        for job in batch:
+                            fail(job, e)
+                if outbox is not None:
+                    outbox.put(_DONE)
+
+            return [threading.Thread(target=worker, name=f"ingest-{name}", daemon=True)]
+
+        def upsert(batch: List[Dict]):
+            # Stale rows of skipped files are deleted here as well, so this thread stays the only
+            # one writing to the vector DB (and its keyword index) while the pipeline runs.
+            jobs = [job for job in batch if not job.get("cleanup")]
+            for job in batch:
+                if job.get("cleanup"):
+                    self._delete_stale(job["stale_ids"])
+            if jobs:
+                self._upsert(jobs)
+            with lock:
+                for job in jobs:
+                    processed.append(job["filename"])
+                    total_chunks[0] += len(job["chunks"])
+                    collapsed_chunks[0] += len(job["chunks"]) - len(job["stored"])
+            return batch
+
+        classify_executor = ThreadPoolExecutor(max_workers=self.classify_workers, thread_name_prefix="ingest-llm")
+        threads = (
+            stage("extract", self._extract, queues["chunk"], workers=self.extract_workers)
+            + stage("chunk", self._chunk, queues["classify"])
+            # Files are classified one at a time; their chunks fan out to the LLM executor.
+            + stage("classify", lambda job: self._classify(job, classify_executor), queues["embed"])
+            + batched("embed", self._embed, queues["upsert"], self.embed_batch_size)
+            + batched("upsert", upsert, None, self.upsert_batch_size)
+        )
+        for thread in threads:
+            thread.start()
+
+        try:
+            for path in paths:
+                job = {"path": str(path), "filename": os.path.basename(path)}
+                try:
+                    status, job["file_hash"], job["stale_ids"] = self.manifest.check(job["path"])
+                except OSError as e:
+                    fail(job, e)
+                    continue
+                if status != "new":
+                    skipped.append(job["filename"])
+                    if job["stale_ids"]:
+                        queues["upsert"].put(dict(job, chunks=[], cleanup=True))
+                    continue
+                if job["file_hash"] in queued:
+                    # Same bytes as a file already queued in this run: decided once that one is in.
+                    deferred.append(job)
+                    continue
+                queued[job["file_hash"]] = job["filename"]
+                queues["extract"].put(job)
+            queues["extract"].put(_DONE)
+
+            for thread in threads:
+                thread.join()
+        finally:
+            classify_executor.shutdown(wait=False)
+
+        # The pipeline threads are done: from here on this thread is the only writer.
+        for job in deferred:
+            status, _, stale_ids = self.manifest.check(job["path"])
+            if status == "new":
+                fail(job, RuntimeError(f"conteúdo idêntico a {queued[job['file_hash']]}, que não foi ingerido"))
+                continue
+            skipped.append(job["filename"])
+            self._delete_stale(stale_ids)
+
+        elapsed = time.perf_counter() - started
+        self.manifest.save()
+        print(f"[ingest] {len(processed)}/{len(paths)} arquivos ({len(skipped)} sem alterações), "
+              f"{total_chunks[0]} chunks ({collapsed_chunks[0]} quase-duplicados) em {elapsed:.1f}s")
+        return {
+            "processed_files": processed,
+            "skipped_files": skipped,
+            "failed_files": failed,
+            "total_chunks": total_chunks[0],
+            "collapsed_chunks": collapsed_chunks[0],
+            "seconds": elapsed
+        }
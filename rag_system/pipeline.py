@@ -1,17 +1,84 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
 from rag_system.retrieval.re import RetrievalSystem
+from rag_system.semantic_cache import SemanticAnswerCache
 
 class RagSystemPipeline:
-    
-    def __init__(self, retriever: RetrievalSystem, semantical_model=None):
+
+    def __init__(self, retriever: RetrievalSystem, semantical_model=None, semantic_cache: Optional[SemanticAnswerCache] = None, max_workers: int = 8):
         self.retriever = retriever
         self.semantical_model = semantical_model
-        
-    def run(self, query_user: str, n_retrievals: int = 30, final_k: int = 5):
-    
-        retrieval_results = self.retriever.retrieve(query_user, n_results=n_retrievals,final_k=final_k, semantical_model=self.semantical_model)
-        
+        self.semantic_cache = semantic_cache
+        # Bounded pool for the CPU-bound / blocking stages of arun().
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-pipeline")
+
+    def run(self, query_user: str, n_retrievals: int = 30, final_k: int = 5, filters: Optional[Dict] = None):
+        filters = filters or {}
+
+        scope = query_embedding = cache_entry = None
+        if self.semantic_cache is not None:
+            self.semantic_cache.ensure_version(self.retriever.vector_db.version)
+            scope = self.semantic_cache.scope_key(n_retrievals=n_retrievals, final_k=final_k, **filters)
+            query_embedding = self.retriever.vector_db.embed_query(query_user, semantical_model=self.semantical_model)
+            cache_entry = self.semantic_cache.lookup(query_embedding, scope)
+
+        if cache_entry is not None:
+            retrieval_results = self._replay(cache_entry)
+        else:
+            retrieval_results = self.retriever.retrieve(query_user, n_results=n_retrievals,final_k=final_k, semantical_model=self.semantical_model, **filters)
+            self._remember_retrieval(query_embedding, scope, query_user, retrieval_results)
+
+        return self.build_prompt(query_user, retrieval_results), retrieval_results
+
+    async def arun(self, query_user: str, n_retrievals: int = 30, final_k: int = 5, filters: Optional[Dict] = None):
+        filters = filters or {}
+        loop = asyncio.get_running_loop()
+
+        scope = query_embedding = cache_entry = None
+        if self.semantic_cache is not None:
+            self.semantic_cache.ensure_version(self.retriever.vector_db.version)
+            scope = self.semantic_cache.scope_key(n_retrievals=n_retrievals, final_k=final_k, **filters)
+            query_embedding = await loop.run_in_executor(
+                self.executor,
+                functools.partial(self.retriever.vector_db.embed_query, query_user, semantical_model=self.semantical_model)
+            )
+            cache_entry = self.semantic_cache.lookup(query_embedding, scope)
+
+        if cache_entry is not None:
+            retrieval_results = self._replay(cache_entry)
+        else:
+            retrieval_results = await self.retriever.aretrieve(
+                query_user, n_results=n_retrievals, final_k=final_k,
+                semantical_model=self.semantical_model, executor=self.executor, **filters
+            )
+            self._remember_retrieval(query_embedding, scope, query_user, retrieval_results)
+
+        return self.build_prompt(query_user, retrieval_results), retrieval_results
+
+    def _replay(self, cache_entry: Dict) -> Dict:
+        print(f"Semantic cache hit ({cache_entry['similarity']:.3f}): {cache_entry['query']}")
+        retrieval_results = dict(cache_entry["retrieval_results"])
+        retrieval_results["semantic_cache_id"] = cache_entry["id"]
+        retrieval_results["cached_answer"] = cache_entry["answer_tokens"]
+        return retrieval_results
+
+    def _remember_retrieval(self, query_embedding, scope, query_user: str, retrieval_results: Dict):
+        if self.semantic_cache is not None:
+            retrieval_results["semantic_cache_id"] = self.semantic_cache.store(
+                query_embedding, scope, query_user, retrieval_results
+            )
+
+    def remember_answer(self, retrieval_results: Dict, answer_tokens: List[str]):
+        entry_id = retrieval_results.get("semantic_cache_id")
+        if self.semantic_cache is not None and entry_id is not None:
+            self.semantic_cache.set_answer(entry_id, answer_tokens)
+
+    def build_prompt(self, query_user: str, retrieval_results: Dict) -> str:
         docs = retrieval_results.get('documents', [])
-        
+
         if len(docs) == 0:
             context_combined = "Nenhum contexto encontrado."
         else:
@@ -41,5 +108,5 @@ class RagSystemPipeline:
 
         Resposta:
         """
-        
-        return prompt, retrieval_results
+
+        return prompt
@@ -0,0 +1,267 @@
+import math
+import os
+import pickle
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from rag_system.VectorDB.filters import flatten_where
+
+INDEX_FORMAT_VERSION = 1
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+PT_STOPWORDS = frozenset({
+    "a", "ao", "aos", "as", "com", "como", "da", "das", "de", "do", "dos", "e", "ela", "ele",
+    "em", "entre", "esse", "essa", "este", "esta", "isso", "isto", "foi", "ha", "mais", "mas",
+    "na", "nas", "nao", "no", "nos", "o", "os", "ou", "para", "pela", "pelas", "pelo", "pelos",
+    "por", "qual", "quais", "que", "se", "sem", "ser", "sao", "seu", "sua", "seus", "suas",
+    "sobre", "um", "uma", "umas", "uns", "the", "of", "and", "in", "to", "is", "for", "on",
+})
+
+
+def fold_accents(text: str) -> str:
+    normalized = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in normalized if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    folded = fold_accents(text.lower())
+    return [
+        token for token in _TOKEN_PATTERN.findall(folded)
+        if len(token) > 1 and token not in PT_STOPWORDS
+    ]
+
+
+class BM25Index:
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75,
+                 metadata_fields: Iterable[str] = ("pdf_name", "section", "author", "title")):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.metadata_fields = tuple(metadata_fields)
+
+        self.doc_ids: List[Optional[str]] = []
+        self.doc_lengths: List[int] = []
+        self.doc_terms: List[List[str]] = []
+        self.doc_meta: List[Optional[Dict]] = []
+        self.id_to_idx: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.total_length = 0
+        # Catalog version the owner last saved this index at (None for older pickles).
+        self.synced_version: Optional[int] = None
+
+        self._compiled_postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._lengths_array: Optional[np.ndarray] = None
+        self._meta_columns: Dict[str, np.ndarray] = {}
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self.id_to_idx)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.id_to_idx
+
+    def add(self, doc_id: str, text: str, metadata: Optional[Dict] = None):
+        if doc_id in self.id_to_idx:
+            self.remove(doc_id)
+
+        term_counts = Counter(tokenize(text or ""))
+        idx = len(self.doc_ids)
+
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(sum(term_counts.values()))
+        self.doc_terms.append(list(term_counts))
+        self.doc_meta.append({
+            field: (metadata or {}).get(field) for field in self.metadata_fields
+        })
+        self.id_to_idx[doc_id] = idx
+        self.total_length += self.doc_lengths[idx]
+
+        for term, tf in term_counts.items():
+            self.postings.setdefault(term, {})[idx] = tf
+            self._compiled_postings.pop(term, None)
+
+        self._invalidate_arrays()
+
+    def add_many(self, ids: List[str], texts: List[str], metadatas: Optional[List[Dict]] = None):
+        metadatas = metadatas or [None] * len(ids)
+        for doc_id, text, meta in zip(ids, texts, metadatas):
+            self.add(doc_id, text, meta)
+
+    def remove(self, doc_id: str):
+        idx = self.id_to_idx.pop(doc_id, None)
+        if idx is None:
+            return
+
+        for term in self.doc_terms[idx]:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(idx, None)
+            if not postings:
+                del self.postings[term]
+            self._compiled_postings.pop(term, None)
+
+        self.total_length -= self.doc_lengths[idx]
+        self.doc_ids[idx] = None
+        self.doc_lengths[idx] = 0
+        self.doc_terms[idx] = []
+        self.doc_meta[idx] = None
+        self._invalidate_arrays()
+
+    def _invalidate_arrays(self):
+        self._lengths_array = None
+        self._meta_columns = {}
+
+    def _postings_arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        compiled = self._compiled_postings.get(term)
+        if compiled is None:
+            postings = self.postings.get(term, {})
+            compiled = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings)),
+            )
+            self._compiled_postings[term] = compiled
+        return compiled
+
+    def _lengths(self) -> np.ndarray:
+        if self._lengths_array is None:
+            self._lengths_array = np.asarray(self.doc_lengths, dtype=np.float32)
+        return self._lengths_array
+
+    def _column(self, field: str) -> np.ndarray:
+        column = self._meta_columns.get(field)
+        if column is None:
+            column = np.array(
+                [meta.get(field) if meta else None for meta in self.doc_meta],
+                dtype=object
+            )
+            self._meta_columns[field] = column
+        return column
+
+    def _where_mask(self, where: Optional[Dict], rows: np.ndarray) -> Optional[np.ndarray]:
+        # Filter mask over the given row indices only.
+        filters = flatten_where(where)
+        if not filters:
+            return None
+
+        mask = np.ones(len(rows), dtype=bool)
+        for field, value in filters.items():
+            if field not in self.metadata_fields:
+                raise ValueError(f"Field '{field}' is not stored in the keyword index.")
+            mask &= self._column(field)[rows] == value
+        return mask
+
+    def search(self, query: str, n_results: int = 10, where: Optional[Dict] = None) -> List[Tuple[str, float]]:
+        n_docs = len(self.id_to_idx)
+        terms = set(tokenize(query))
+        if n_docs == 0 or not terms or n_results <= 0:
+            return []
+
+        lengths = self._lengths()
+        avgdl = max(self.total_length / n_docs, 1e-9)
+
+        # Sparse accumulation: only documents containing a query term are ever scored, so a
+        # query costs O(matching postings) instead of a zeroed array over the whole corpus.
+        matched_docs, contributions = [], []
+        for term in terms:
+            docs, tfs = self._postings_arrays(term)
+            if len(docs) == 0:
+                continue
+            idf = math.log(1.0 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * lengths[docs] / avgdl)
+            matched_docs.append(docs)
+            contributions.append(idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+        if not matched_docs:
+            return []
+
+        rows, inverse = np.unique(np.concatenate(matched_docs), return_inverse=True)
+        row_scores = np.bincount(inverse, weights=np.concatenate(contributions)).astype(np.float32)
+
+        mask = self._where_mask(where, rows)
+        if mask is not None:
+            row_scores[~mask] = 0.0
+
+        candidates = np.flatnonzero(row_scores > 0)
+        if len(candidates) == 0:
+            return []
+
+        if len(candidates) > n_results:
+            top = np.argpartition(-row_scores[candidates], n_results - 1)[:n_results]
+            candidates = candidates[top]
+
+        candidates = candidates[np.argsort(-row_scores[candidates], kind="stable")]
+        return [(self.doc_ids[rows[i]], float(row_scores[i])) for i in candidates]
+
+    def compact(self):
+        live = [idx for idx, doc_id in enumerate(self.doc_ids) if doc_id is not None]
+        if len(live) == len(self.doc_ids):
+            return
+
+        remap = {old: new for new, old in enumerate(live)}
+        self.doc_ids = [self.doc_ids[idx] for idx in live]
+        self.doc_lengths = [self.doc_lengths[idx] for idx in live]
+        self.doc_terms = [self.doc_terms[idx] for idx in live]
+        self.doc_meta = [self.doc_meta[idx] for idx in live]
+        self.id_to_idx = {doc_id: idx for idx, doc_id in enumerate(self.doc_ids)}
+        self.postings = {
+            term: {remap[idx]: tf for idx, tf in postings.items()}
+            for term, postings in self.postings.items()
+        }
+        self._compiled_postings = {}
+        self._invalidate_arrays()
+
+    def save(self):
+        if not self.path:
+            return
+
+        if len(self.doc_ids) > 1.25 * max(len(self.id_to_idx), 1):
+            self.compact()
+
+        state = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "metadata_fields": self.metadata_fields,
+            "doc_ids": self.doc_ids,
+            "doc_lengths": self.doc_lengths,
+            "doc_terms": self.doc_terms,
+            "doc_meta": self.doc_meta,
+            "postings": self.postings,
+            "total_length": self.total_length,
+            "synced_version": self.synced_version,
+        }
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        with open(self.path, "rb") as f:
+            state = pickle.load(f)
+
+        if state.get("format_version") != INDEX_FORMAT_VERSION:
+            print(f"[WARN] Índice BM25 com formato incompatível ({self.path}), será reconstruído.")
+            return
+
+        self.k1 = state["k1"]
+        self.b = state["b"]
+        self.metadata_fields = tuple(state["metadata_fields"])
+        self.doc_ids = state["doc_ids"]
+        self.doc_lengths = state["doc_lengths"]
+        self.doc_terms = state["doc_terms"]
+        self.doc_meta = state["doc_meta"]
+        self.postings = state["postings"]
+        self.total_length = state["total_length"]
+        self.synced_version = state.get("synced_version")
+        self.id_to_idx = {doc_id: idx for idx, doc_id in enumerate(self.doc_ids) if doc_id is not None}
+        self._compiled_postings = {}
+        self._invalidate_arrays()
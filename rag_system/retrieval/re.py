@@ -1,42 +1,79 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from concurrent.futures import Executor, ThreadPoolExecutor
+import asyncio
+import functools
 import re
+import hashlib
+import numpy as np
 try:
     from rapidfuzz import fuzz
 except Exception:
     fuzz = None
 from sentence_transformers import CrossEncoder
-from rag_system.chunking.section_classifier import SectionClassifier
+from rag_system.retrieval.section_router import SectionRouter
+from rag_system.utils.cache import LRUCache, normalize_query
+from rag_system.utils.batching import shared_batcher
+from rag_system.utils.token_counts import fit_to_budget
 from main.generator import OllamaGenerator
 class RetrievalSystem:
-    def __init__(self, vector_db, max_tokens: int = 10000):
+    def __init__(
+        self,
+        vector_db,
+        max_tokens: int = 10000,
+        hybrid: bool = False,
+        rrf_k: int = 60,
+        max_candidates: int = 30,
+        n_keyword_results: int = 30,
+        rerank_mode: str = "full",
+        cascade_top_m: int = 20,
+        cascade_batch_size: int = 4,
+        cascade_patience: int = 2,
+        rerank_cache_size: int = 10000,
+        rerank_cache_ttl: Optional[float] = 3600,
+        batch_max_size: Optional[int] = None,
+        batch_max_wait_ms: float = 5.0,
+        section_min_margin: float = 0.05,
+        section_llm_timeout: float = 1.5,
+        section_use_llm: bool = True
+    ):
 
         self.reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
         self.vector_db = vector_db
         self.max_tokens = max_tokens
-        self.section_classifier = None
+        self.section_router = SectionRouter(
+            min_margin=section_min_margin,
+            llm_timeout=section_llm_timeout,
+            use_llm=section_use_llm,
+            embedding_cache=getattr(vector_db, "embedding_cache", None)
+        )
+
+        self.hybrid = hybrid
+        self.rrf_k = rrf_k
+        self.max_candidates = max_candidates
+        self.n_keyword_results = n_keyword_results
+        self._search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-search")
+
+        if rerank_mode not in ("full", "cascade"):
+            raise ValueError(f"Unknown rerank_mode '{rerank_mode}', expected 'full' or 'cascade'.")
+        self.rerank_mode = rerank_mode
+        self.cascade_top_m = cascade_top_m
+        self.cascade_batch_size = max(1, cascade_batch_size)
+        self.cascade_patience = max(1, cascade_patience)
+
+        self.rerank_cache = LRUCache(max_size=rerank_cache_size, ttl=rerank_cache_ttl)
+
+        self._rerank_batcher = None
+        if batch_max_size:
+            self._rerank_batcher = shared_batcher(
+                ("predict", id(self.reranker)),
+                self.reranker.predict,
+                max_batch_size=batch_max_size,
+                max_wait_ms=batch_max_wait_ms,
+                name="reranker"
+            )
 
     def _truncate_context(self, documents: List[Dict[str, str]], tokenizer=None) -> List[Dict[str, str]]:
-        if not tokenizer:
-            total_tokens = 0
-            truncated_docs = []
-            for doc in documents:
-                doc_tokens = len(doc['text'].split())
-                if total_tokens + doc_tokens > self.max_tokens:
-                    break
-                truncated_docs.append(doc)
-                total_tokens += doc_tokens
-            return truncated_docs
-        else:
-            total_tokens = 0
-            truncated_docs = []
-            for doc in documents:
-                doc_tokens = len(tokenizer.encode(doc['text']))
-                if total_tokens + doc_tokens > self.max_tokens:
-                    break
-                truncated_docs.append(doc)
-                total_tokens += doc_tokens
-            return truncated_docs
-    
+        return fit_to_budget(documents, self.max_tokens, tokenizer=tokenizer)
 
     def _metadata_similarity(self, query: str, doc: Dict) -> float:
         q_lower = query.lower().strip()
@@ -64,10 +101,13 @@ class RetrievalSystem:
             best = max(best, score)
         return best
 
-    def _rerank(self, query: str, documents: List[Dict], top_k: int = 5):
-        pairs = [(query, doc["text"]) for doc in documents]
+    def _rerank(self, query: str, documents: List[Dict], top_k: int = 5, query_embedding=None,
+                scores: Optional[List[float]] = None):
+        if self.rerank_mode == "cascade":
+            return self._cascade_rerank(query, documents, top_k=top_k, query_embedding=query_embedding)
 
-        scores = self.reranker.predict(pairs)
+        if scores is None:
+            scores = self._cross_encoder_scores(query, documents)
 
         blended = []
         for doc, base in zip(documents, scores):
@@ -79,19 +119,211 @@ class RetrievalSystem:
         
         return [doc for doc, _ in blended[:top_k]]
 
-    def _keyword_search(self, query: str, all_documents: List[Dict]):
-        query_terms = query.lower().split()
+    def _chunk_key(self, doc: Dict) -> str:
+        return doc.get("id") or hashlib.md5(doc["text"].encode("utf-8")).hexdigest()
+
+    def _cross_encoder_scores(self, query: str, documents: List[Dict]) -> List[float]:
+        return self._cross_encoder_scores_many([(query, documents)])[0]
+
+    def _cross_encoder_scores_many(
+        self,
+        requests: List[Tuple[str, List[Dict]]],
+        predict_batch_size: Optional[int] = None
+    ) -> List[List[float]]:
+        # Scores several (query, documents) requests with one cross-encoder call for all cache misses.
+        # With predict_batch_size the pairs go straight to predict() in batches of that size
+        # (offline use); otherwise they go through the shared micro-batcher when configured.
+        self.rerank_cache.ensure_version(getattr(self.vector_db, "version", None))
+
+        scores = [[None] * len(documents) for _, documents in requests]
+        missing = []
+        for r, (query, documents) in enumerate(requests):
+            normalized = normalize_query(query)
+            for i, doc in enumerate(documents):
+                key = (normalized, self._chunk_key(doc))
+                cached = self.rerank_cache.get(key)
+                if cached is None:
+                    missing.append((r, i, key))
+                else:
+                    scores[r][i] = cached
+
+        if missing:
+            pairs = [(requests[r][0], requests[r][1][i]["text"]) for r, i, _ in missing]
+            if predict_batch_size:
+                predicted = self.reranker.predict(pairs, batch_size=predict_batch_size)
+            elif self._rerank_batcher:
+                predicted = self._rerank_batcher(pairs)
+            else:
+                predicted = self.reranker.predict(pairs)
+
+            for (r, i, key), score in zip(missing, predicted):
+                scores[r][i] = float(score)
+                self.rerank_cache.put(key, scores[r][i])
+
+        return scores
+
+    def rerank_cache_stats(self) -> Dict:
+        return self.rerank_cache.stats()
+
+    def _fill_dense_scores(self, documents: List[Dict], query_embedding):
+        missing = [doc for doc in documents if doc.get("dense_score") is None and doc.get("id")]
+        if not missing or query_embedding is None:
+            return
+
+        fetched = self.vector_db.get([doc["id"] for doc in missing], include=["embeddings"])
+        # Local backends and recent Chroma return an ndarray, whose truth value is ambiguous.
+        fetched_embeddings = fetched.get("embeddings")
+        fetched_embeddings = [] if fetched_embeddings is None else fetched_embeddings
+        embeddings = dict(zip(fetched.get("ids") or [], fetched_embeddings))
+
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q_norm = np.linalg.norm(q) or 1.0
+        for doc in missing:
+            emb = embeddings.get(doc["id"])
+            if emb is None:
+                continue
+            emb = np.asarray(emb, dtype=np.float32)
+            doc["dense_score"] = float(np.dot(q, emb) / (q_norm * (np.linalg.norm(emb) or 1.0)))
+
+    def _cascade_rerank(self, query: str, documents: List[Dict], top_k: int = 5, query_embedding=None):
+        # Stage 1: bi-encoder similarity + metadata boost for every candidate.
+        self._fill_dense_scores(documents, query_embedding)
+
+        cheap = []
+        for doc in documents:
+            meta_boost = self._metadata_similarity(query, doc)
+            cheap.append((doc, meta_boost, (doc.get("dense_score") or 0.0) + 0.2 * meta_boost))
+        cheap.sort(key=lambda x: x[2], reverse=True)
+
+        shortlist = cheap[:max(self.cascade_top_m, top_k)]
+
+        # Stage 2: cross-encoder over the shortlist in small batches, stopping once the top-k settles.
+        blended = []
+        previous_top = None
+        stable_batches = 0
+        for start in range(0, len(shortlist), self.cascade_batch_size):
+            batch = shortlist[start:start + self.cascade_batch_size]
+            scores = self._cross_encoder_scores(query, [doc for doc, _, _ in batch])
+
+            for (doc, meta_boost, _), base in zip(batch, scores):
+                blended.append((doc, float(base) + 0.2 * meta_boost))
+
+            if len(blended) < top_k:
+                continue
+
+            blended.sort(key=lambda x: x[1], reverse=True)
+            current_top = [id(doc) for doc, _ in blended[:top_k]]
+            if current_top == previous_top:
+                stable_batches += 1
+                if stable_batches >= self.cascade_patience:
+                    break
+            else:
+                stable_batches = 0
+            previous_top = current_top
+
+        blended.sort(key=lambda x: x[1], reverse=True)
+        print(f"Cascade rerank: {len(blended)}/{len(documents)} candidates scored by the cross-encoder.")
+
+        return [doc for doc, _ in blended[:top_k]]
+
+    def _to_document(self, doc_id: Optional[str], text, meta: Optional[Dict]) -> Optional[Dict]:
+        if not text:
+            return None
+
+        text = str(text).strip()
+        if not text:
+            return None
+
+        meta = meta or {}
+        return {
+            "id": doc_id,
+            "text": text,
+            "title": meta.get("title"),
+            "author": meta.get("author"),
+            "page": meta.get("page") or meta.get("page_number"),
+            "section": meta.get("section"),
+            "pdf_name": meta.get("pdf_name"),
+            "token_count": meta.get("token_count"),
+            "token_encoding": meta.get("token_encoding"),
+            "word_count": meta.get("word_count"),
+            # other PDFs whose near-identical chunk was collapsed onto this one at ingestion
+            "also_in": meta["also_in"].split("|") if meta.get("also_in") else []
+        }
+
+    def _keyword_search(self, query: str, n_results: int = 10, where_filter: Optional[Dict] = None) -> List[Dict]:
+        hits = self.vector_db.keyword_search(query, n_results=n_results, where=where_filter)
+        if not hits:
+            return []
+
+        fetched = self.vector_db.get([doc_id for doc_id, _ in hits])
+        by_id = {
+            doc_id: (text, meta)
+            for doc_id, text, meta in zip(fetched.get("ids") or [], fetched.get("documents") or [], fetched.get("metadatas") or [])
+        }
+
+        documents = []
+        for doc_id, score in hits:
+            if doc_id not in by_id:
+                continue
+            doc = self._to_document(doc_id, *by_id[doc_id])
+            if doc:
+                doc["keyword_score"] = score
+                documents.append(doc)
+        return documents
+
+    def _dense_search(self, query_embedding, n_results: int, where_filter: Optional[Dict] = None) -> List[Dict]:
+        results = self.vector_db.query(
+            [query_embedding],
+            n_results=n_results,
+            where=where_filter if where_filter else None
+        )
+        return self._dense_documents(results, 0)
 
-        hits = []
-        for doc in all_documents:
-            text_lower = doc["text"].lower()
-            score = sum(1 for term in query_terms if term in text_lower)
+    def _dense_documents(self, results: Dict, i: int) -> List[Dict]:
+        # Documents for the i-th query of a (possibly multi-query) vector store result.
+        def column(key):
+            values = results.get(key) or []
+            return (values[i] if i < len(values) else None) or []
 
-            if score > 0:
-                hits.append((score, doc))
+        ids_list = column('ids')
+        docs_list = column('documents')
+        metas_list = column('metadatas')
+        distances = column('distances') or [None] * len(ids_list)
 
-        hits.sort(key=lambda x: x[0], reverse=True)
-        return [doc for _, doc in hits]
+        documents = []
+        for doc_id, text, meta, distance in zip(ids_list, docs_list, metas_list, distances):
+            doc = self._to_document(doc_id, text, meta)
+            if not doc:
+                continue
+            if distance is not None:
+                doc["dense_score"] = 1.0 - float(distance)
+            documents.append(doc)
+        return documents
+
+    def _reciprocal_rank_fusion(self, rankings: List[List[Dict]], limit: Optional[int] = None) -> List[Dict]:
+        fused = {}
+        scores = {}
+        for ranking in rankings:
+            for rank, doc in enumerate(ranking, start=1):
+                key = doc.get("id") or doc["text"]
+                if key in fused:
+                    fused[key].update({k: v for k, v in doc.items() if k not in fused[key]})
+                else:
+                    fused[key] = dict(doc)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank)
+
+        merged = []
+        seen_texts = set()
+        for key in sorted(fused, key=lambda key: scores[key], reverse=True):
+            doc = fused[key]
+            if doc["text"] in seen_texts:
+                continue
+            seen_texts.add(doc["text"])
+            doc["rrf_score"] = scores[key]
+            merged.append(doc)
+            if limit is not None and len(merged) >= limit:
+                break
+        return merged
 
     def _rewrite_query(self, query: str, llm: OllamaGenerator= OllamaGenerator()):
         return query
@@ -119,73 +351,26 @@ class RetrievalSystem:
         )
         return llm.generate(prompt)
 
-    def _infer_section_from_query(self, query: str, semantical_model=None, llm:OllamaGenerator = OllamaGenerator()) -> Optional[str]:
-        ql = query.lower()
-        mapping = {
-            "introduction": ["introducao", "introdução", "introduce", "intro"],
-            "background": ["background", "fundamentação", "fundamentacao", "referencial", "related work", "trabalhos relacionados"],
-            "method": ["metodo", "metodologia", "método", "methods", "method"],
-            "results": ["resultado", "resultados", "results"],
-            "discussion": ["discussao", "discussão", "discussion"],
-            "conclusion": ["conclusao", "conclusão", "conclusion"],
-        }
+    def _infer_section_from_query(self, query: str, semantical_model=None, llm:OllamaGenerator = OllamaGenerator(), query_embedding=None) -> Optional[str]:
+        return self.section_router.route(query, semantical_model=semantical_model, llm=llm, query_embedding=query_embedding)
 
-        if llm:
-            prompt = (
-                "Identifique a seção acadêmica alvo desta pergunta (introduction, background, method, results, discussion, conclusion).\n"
-                "Responda apenas com o nome da seção.\nPergunta: " + query
-            )
-            try:
-                resp = str(llm.generate(prompt)).lower()
-                for section in mapping.keys():
-                    if section in resp:
-                        return section
-            except Exception:
-                pass
-            
-        for section, keywords in mapping.items():
-            if any(k in ql for k in keywords):
-                return section
-
-
-        if semantical_model and self.section_classifier is None:
-            try:
-                self.section_classifier = SectionClassifier(semantical_model)
-            except Exception:
-                self.section_classifier = None
-        if self.section_classifier:
-            try:
-                return self.section_classifier.classify(query)
-            except Exception:
-                return None
-        return None
-    
-    def retrieve(
+    def _filter_matches_catalog(self, field: str, value) -> bool:
+        catalog = getattr(self.vector_db, "catalog", None)
+        if catalog is None or not catalog.known(field):
+            return True
+        return catalog.count(field, value) > 0
+
+    def _build_where_filter(
         self,
         query: str,
-        n_results: int = 30,
-        final_k: int = 5,
-        semantical_model=None,
-        tokenizer=None,
-        llm:OllamaGenerator=OllamaGenerator(),
-        all_documents_for_keyword=None,
-        pdf_name: str = None,    
-        section: str = None,
+        pdf_name: Optional[str] = None,
+        section: Optional[str] = None,
         author: Optional[str] = None,
-        title: Optional[str] = None
-    ) -> Dict[str, List[Dict]]:
-
-        query_for_search = self._rewrite_query(query, llm=llm)
-        
-        print("Query for search:", query_for_search)
-
-        query_embedding = self.vector_db.embed_query(
-            query_for_search,
-            semantical_model=semantical_model
-        )
-
-        print(n_results, "results will be retrieved from vector DB.")
-
+        title: Optional[str] = None,
+        semantical_model=None,
+        llm: OllamaGenerator = None,
+        query_embedding=None
+    ) -> Dict:
         where_filter = {}
 
         if pdf_name:
@@ -200,61 +385,63 @@ class RetrievalSystem:
             where_filter["title"] = title
 
         if "section" not in where_filter:
-            inferred_section = self._infer_section_from_query(query, semantical_model=semantical_model, llm=llm)
-            if inferred_section:
+            inferred_section = self._infer_section_from_query(
+                query, semantical_model=semantical_model, llm=llm, query_embedding=query_embedding
+            )
+            if inferred_section and self._filter_matches_catalog("section", inferred_section):
                 where_filter["section"] = inferred_section
 
         print("Using filter:", where_filter)
-        dados = self.vector_db.collection.get()
-            
-        results = self.vector_db.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results,
-            where=where_filter if where_filter else None
-        )
-        
-        print()
+        return where_filter
 
-        documents = []
-        docs_list = results.get('documents', [[]])[0]
-        metas_list = results.get('metadatas', [[]])[0]
+    def _searchable(self, where_filter: Dict) -> bool:
+        if all(self._filter_matches_catalog(field, value) for field, value in where_filter.items()):
+            return True
+        print("Filter does not match any indexed chunk, skipping search.")
+        return False
 
-        for text, meta in zip(docs_list, metas_list):
+    def _merge_unique(self, dense_docs: List[Dict], keyword_docs: List[Dict]) -> List[Dict]:
+        for doc in dense_docs:
+            print("section in meta:", doc["section"])
+            print("text", doc["text"][:100])
 
-            if not text:
-                continue
-
-            text = str(text).strip()
-            if not text:
-                continue
-            
-            print("section in meta:", meta.get("section") if meta else None)
-            print("text", text[:100])
-            
-            documents.append({
-                "text": text,
-                "title": meta.get("title") if meta else None,
-                "author": meta.get("author") if meta else None,
-                "page": (meta.get("page") if meta else None) or (meta.get("page_number") if meta else None),
-                "section": meta.get("section") if meta else None,
-                "pdf_name": meta.get("pdf_name") if meta else None
-            })
-
-        print(len(documents), "documents retrieved from vector DB.")
+        print(len(dense_docs), "documents retrieved from vector DB.")
 
         seen_texts = set()
         filtered_docs = []
-        for doc in documents:
+        for doc in dense_docs + keyword_docs:
             if doc['text'] not in seen_texts:
                 filtered_docs.append(doc)
                 seen_texts.add(doc['text'])
+        return filtered_docs
 
-        if all_documents_for_keyword:
-            keyword_hits = self._keyword_search(query, all_documents_for_keyword)
-            filtered_docs.extend(keyword_hits)
+    def _fuse(self, dense_docs: List[Dict], keyword_docs: List[Dict]) -> List[Dict]:
+        print(len(dense_docs), "dense and", len(keyword_docs), "keyword documents retrieved.")
 
+        return self._reciprocal_rank_fusion(
+            [dense_docs, keyword_docs],
+            limit=self.max_candidates
+        )
+
+    def _finalize(
+        self,
+        query: str,
+        query_for_search: str,
+        filtered_docs: List[Dict],
+        where_filter: Dict,
+        final_k: int,
+        tokenizer=None,
+        query_embedding=None,
+        pdf_name: Optional[str] = None,
+        section: Optional[str] = None,
+        author: Optional[str] = None,
+        title: Optional[str] = None,
+        rerank_scores: Optional[List[float]] = None
+    ) -> Dict[str, List[Dict]]:
 
-        reranked_docs = self._rerank(query, filtered_docs, top_k=final_k)
+        reranked_docs = self._rerank(
+            query, filtered_docs, top_k=final_k, query_embedding=query_embedding, scores=rerank_scores
+        ) if filtered_docs else []
 
         if reranked_docs:
             main_pdf_name = reranked_docs[0].get("pdf_name")
@@ -272,3 +459,218 @@ class RetrievalSystem:
             "title_hint": title
         }
 
+    def retrieve(
+        self,
+        query: str,
+        n_results: int = 30,
+        final_k: int = 5,
+        semantical_model=None,
+        tokenizer=None,
+        llm:OllamaGenerator=OllamaGenerator(),
+        use_keyword_search: bool = False,
+        n_keyword_results: int = 10,
+        hybrid: Optional[bool] = None,
+        pdf_name: str = None,    
+        section: str = None,
+        author: Optional[str] = None,
+        title: Optional[str] = None
+    ) -> Dict[str, List[Dict]]:
+
+        query_for_search = self._rewrite_query(query, llm=llm)
+        
+        print("Query for search:", query_for_search)
+
+        if hybrid is None:
+            hybrid = self.hybrid
+
+        where_filter = self._build_where_filter(
+            query, pdf_name=pdf_name, section=section, author=author, title=title,
+            semantical_model=semantical_model, llm=llm
+        )
+
+        query_embedding = None
+        if not self._searchable(where_filter):
+            filtered_docs = []
+
+        elif hybrid:
+            # The sparse query runs while this thread embeds the query and hits the vector store.
+            sparse_future = self._search_executor.submit(
+                self._keyword_search, query, n_results=self.n_keyword_results, where_filter=where_filter
+            )
+            query_embedding = self.vector_db.embed_query(query_for_search, semantical_model=semantical_model)
+            dense_docs = self._dense_search(query_embedding, n_results, where_filter)
+            filtered_docs = self._fuse(dense_docs, sparse_future.result())
+
+        else:
+            print(n_results, "results will be retrieved from vector DB.")
+
+            query_embedding = self.vector_db.embed_query(query_for_search, semantical_model=semantical_model)
+            dense_docs = self._dense_search(query_embedding, n_results, where_filter)
+            keyword_docs = []
+            if use_keyword_search:
+                keyword_docs = self._keyword_search(query, n_results=n_keyword_results, where_filter=where_filter)
+            filtered_docs = self._merge_unique(dense_docs, keyword_docs)
+
+        return self._finalize(
+            query, query_for_search, filtered_docs, where_filter, final_k,
+            tokenizer=tokenizer, query_embedding=query_embedding,
+            pdf_name=pdf_name, section=section, author=author, title=title
+        )
+
+    async def aretrieve(
+        self,
+        query: str,
+        n_results: int = 30,
+        final_k: int = 5,
+        semantical_model=None,
+        tokenizer=None,
+        llm:OllamaGenerator=OllamaGenerator(),
+        use_keyword_search: bool = False,
+        n_keyword_results: int = 10,
+        hybrid: Optional[bool] = None,
+        pdf_name: str = None,
+        section: str = None,
+        author: Optional[str] = None,
+        title: Optional[str] = None,
+        executor: Optional[Executor] = None
+    ) -> Dict[str, List[Dict]]:
+        loop = asyncio.get_running_loop()
+
+        def offload(fn, *args, **kwargs):
+            return loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+        query_for_search = await offload(self._rewrite_query, query, llm=llm)
+
+        print("Query for search:", query_for_search)
+
+        if hybrid is None:
+            hybrid = self.hybrid
+
+        # Section inference does not depend on the query embedding, so both run at the same time.
+        where_filter, query_embedding = await asyncio.gather(
+            offload(
+                self._build_where_filter, query, pdf_name=pdf_name, section=section, author=author,
+                title=title, semantical_model=semantical_model, llm=llm
+            ),
+            offload(self.vector_db.embed_query, query_for_search, semantical_model=semantical_model)
+        )
+
+        filtered_docs = []
+        if self._searchable(where_filter):
+            n_sparse = self.n_keyword_results if hybrid else n_keyword_results
+            dense_task = offload(self._dense_search, query_embedding, n_results, where_filter)
+            if hybrid or use_keyword_search:
+                sparse_task = offload(self._keyword_search, query, n_results=n_sparse, where_filter=where_filter)
+                dense_docs, keyword_docs = await asyncio.gather(dense_task, sparse_task)
+            else:
+                dense_docs, keyword_docs = await dense_task, []
+
+            if hybrid:
+                filtered_docs = self._fuse(dense_docs, keyword_docs)
+            else:
+                filtered_docs = self._merge_unique(dense_docs, keyword_docs)
+
+        return await offload(
+            self._finalize, query, query_for_search, filtered_docs, where_filter, final_k,
+            tokenizer=tokenizer, query_embedding=query_embedding,
+            pdf_name=pdf_name, section=section, author=author, title=title
+        )
+
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        n_results: int = 30,
+        final_k: int = 5,
+        semantical_model=None,
+        tokenizer=None,
+        llm:OllamaGenerator=OllamaGenerator(),
+        use_keyword_search: bool = False,
+        n_keyword_results: int = 10,
+        hybrid: Optional[bool] = None,
+        filters: Optional[List[Optional[Dict]]] = None,
+        rerank_batch_size: int = 128
+    ) -> List[Dict[str, List[Dict]]]:
+        # Offline counterpart of retrieve(): one encode call for all queries, one vector store
+        # query per distinct where filter and one cross-encoder pass over every rerank pair.
+        # `filters[i]` holds the pdf_name/section/author/title hints of queries[i].
+        # Returns one retrieve()-shaped dict per query, in order.
+        if hybrid is None:
+            hybrid = self.hybrid
+
+        filters = filters or [None] * len(queries)
+        if len(filters) != len(queries):
+            raise ValueError("filters must have one entry per query.")
+        hints = [
+            {field: (f or {}).get(field) for field in ("pdf_name", "section", "author", "title")}
+            for f in filters
+        ]
+
+        queries_for_search = [self._rewrite_query(query, llm=llm) for query in queries]
+
+        # One encode call covers the search texts and the original queries the section router
+        # classifies, so routed queries never reach the model one at a time.
+        embedded = self.vector_db.embed_queries(queries_for_search + list(queries), semantical_model=semantical_model)
+        query_embeddings, routing_embeddings = embedded[:len(queries)], embedded[len(queries):]
+
+        where_filters = [
+            self._build_where_filter(
+                query, semantical_model=semantical_model, llm=llm, query_embedding=query_embedding, **hint
+            )
+            for query, query_embedding, hint in zip(queries, routing_embeddings, hints)
+        ]
+
+        # Queries sharing a where filter are answered by a single multi-query search.
+        groups: Dict[Tuple, List[int]] = {}
+        for i, where_filter in enumerate(where_filters):
+            groups.setdefault(tuple(sorted(where_filter.items())), []).append(i)
+
+        dense_docs: List[List[Dict]] = [[] for _ in queries]
+        searchable = [False] * len(queries)
+        for key, indices in groups.items():
+            where_filter = dict(key)
+            if not self._searchable(where_filter):
+                continue
+            results = self.vector_db.query(
+                query_embeddings[indices],
+                n_results=n_results,
+                where=where_filter if where_filter else None
+            )
+            for position, i in enumerate(indices):
+                searchable[i] = True
+                dense_docs[i] = self._dense_documents(results, position)
+
+        keyword_docs: List[List[Dict]] = [[] for _ in queries]
+        if hybrid or use_keyword_search:
+            n_sparse = self.n_keyword_results if hybrid else n_keyword_results
+            sparse = [i for i in range(len(queries)) if searchable[i]]
+            found = self._search_executor.map(
+                lambda i: self._keyword_search(queries[i], n_results=n_sparse, where_filter=where_filters[i]),
+                sparse
+            )
+            for i, docs in zip(sparse, found):
+                keyword_docs[i] = docs
+
+        candidates = []
+        for i in range(len(queries)):
+            if not searchable[i]:
+                candidates.append([])
+            elif hybrid:
+                candidates.append(self._fuse(dense_docs[i], keyword_docs[i]))
+            else:
+                candidates.append(self._merge_unique(dense_docs[i], keyword_docs[i]))
+
+        # The cascade stops early per query, so only full reranking is scored up front.
+        rerank_scores = [None] * len(queries)
+        if self.rerank_mode == "full":
+            rerank_scores = self._cross_encoder_scores_many(
+                list(zip(queries, candidates)), predict_batch_size=rerank_batch_size
+            )
+
+        return [
+            self._finalize(
+                queries[i], queries_for_search[i], candidates[i], where_filters[i], final_k,
+                tokenizer=tokenizer, query_embedding=query_embeddings[i],
+                rerank_scores=rerank_scores[i], **hints[i]
+            )
+            for i in range(len(queries))
+        ]
@@ -0,0 +1,132 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional, Tuple
+
+from rag_system.chunking.section_classifier import SectionClassifier
+from rag_system.utils.cache import LRUCache, normalize_query
+
+SECTION_KEYWORDS = {
+    "introduction": ["introducao", "introdução", "introduce", "intro"],
+    "background": ["background", "fundamentação", "fundamentacao", "referencial", "related work", "trabalhos relacionados"],
+    "method": ["metodo", "metodologia", "método", "methods", "method"],
+    "results": ["resultado", "resultados", "results"],
+    "discussion": ["discussao", "discussão", "discussion"],
+    "conclusion": ["conclusao", "conclusão", "conclusion"],
+}
+
+
+class SectionRouter:
+    # keyword rules -> embedding classifier (if confident) -> LLM under a hard timeout.
+    # A timed-out LLM call cannot be cancelled, so at most llm_concurrency calls are ever in
+    # flight; while they all are, the LLM tier is skipped instead of queueing behind them.
+
+    def __init__(
+        self,
+        min_margin: float = 0.05,
+        llm_timeout: float = 1.5,
+        use_llm: bool = True,
+        cache_size: int = 4096,
+        embedding_cache=None,
+        llm_concurrency: int = 2
+    ):
+        self.min_margin = min_margin
+        self.embedding_cache = embedding_cache
+        self.llm_timeout = llm_timeout
+        self.use_llm = use_llm
+
+        self.classifier = None
+        self.cache = LRUCache(max_size=cache_size)
+        self.tier_counts: Dict[str, int] = {"keyword": 0, "classifier": 0, "llm": 0, "none": 0, "llm_skipped": 0}
+        self._llm_slots = threading.BoundedSemaphore(max(1, llm_concurrency))
+        self._llm_executor = ThreadPoolExecutor(max_workers=max(1, llm_concurrency), thread_name_prefix="section-llm")
+
+    def route(self, query: str, semantical_model=None, llm=None, query_embedding=None) -> Optional[str]:
+        key = normalize_query(query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[0]
+
+        start = time.perf_counter()
+        section, tier = self._route_uncached(query, semantical_model=semantical_model, llm=llm, query_embedding=query_embedding)
+        self.tier_counts[tier] += 1
+        print(f"Section inference: {section} via {tier} ({(time.perf_counter() - start) * 1000:.1f} ms)")
+
+        # A busy or timed-out LLM says nothing about the query; try again next time.
+        if tier != "llm_skipped":
+            self.cache.put(key, (section, tier))
+        return section
+
+    def _route_uncached(self, query: str, semantical_model=None, llm=None, query_embedding=None) -> Tuple[Optional[str], str]:
+        section = self._keyword_section(query)
+        if section:
+            return section, "keyword"
+
+        section = self._classifier_section(query, semantical_model, query_embedding)
+        if section:
+            return section, "classifier"
+
+        if self.use_llm and llm:
+            section, answered = self._llm_section(query, llm)
+            if section:
+                return section, "llm"
+            if not answered:
+                return None, "llm_skipped"
+
+        return None, "none"
+
+    def _keyword_section(self, query: str) -> Optional[str]:
+        ql = query.lower()
+        for section, keywords in SECTION_KEYWORDS.items():
+            if any(k in ql for k in keywords):
+                return section
+        return None
+
+    def _classifier_section(self, query: str, semantical_model=None, query_embedding=None) -> Optional[str]:
+        if semantical_model is not None and self.classifier is None:
+            try:
+                self.classifier = SectionClassifier(semantical_model, embedding_cache=self.embedding_cache)
+            except Exception:
+                self.classifier = None
+
+        if self.classifier is None:
+            return None
+
+        try:
+            label, margin = self.classifier.classify_with_margin(query, embedding=query_embedding)
+        except Exception:
+            return None
+
+        return label if margin >= self.min_margin else None
+
+    def _llm_section(self, query: str, llm) -> Tuple[Optional[str], bool]:
+        # Returns (section, whether the LLM answered in time).
+        prompt = (
+            "Identifique a seção acadêmica alvo desta pergunta (introduction, background, method, results, discussion, conclusion).\n"
+            "Responda apenas com o nome da seção.\nPergunta: " + query
+        )
+
+        if not self._llm_slots.acquire(blocking=False):
+            print("[WARN] Inferência de seção pelo LLM ainda ocupada com chamadas anteriores, ignorando.")
+            return None, False
+
+        # The slot is freed when the call really ends, not when we stop waiting for it.
+        future = self._llm_executor.submit(llm.generate, prompt)
+        future.add_done_callback(lambda _: self._llm_slots.release())
+        try:
+            resp = str(future.result(timeout=self.llm_timeout)).lower()
+        except FutureTimeoutError:
+            print(f"[WARN] Inferência de seção pelo LLM excedeu {self.llm_timeout}s, ignorando.")
+            return None, False
+        except Exception:
+            return None, True
+
+        for section in SECTION_KEYWORDS:
+            if section in resp:
+                return section, True
+        return None, True
+
+    def stats(self) -> Dict:
+        stats = self.cache.stats()
+        stats["tiers"] = dict(self.tier_counts)
+        return stats
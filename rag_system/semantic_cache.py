@@ -0,0 +1,108 @@
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    # Reuses retrieval results and generated answers for paraphrased questions.
+    # Entries are scoped by retrieval parameters/filters and dropped when the corpus version moves.
+
+    def __init__(self, similarity_threshold: float = 0.95, max_entries: int = 1000):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.version = None
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._scope_index: Dict[Tuple, Tuple[List[int], np.ndarray]] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def scope_key(**params) -> Tuple:
+        return tuple(sorted((key, value) for key, value in params.items() if value is not None))
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def ensure_version(self, version):
+        if version == self.version:
+            return
+        with self._lock:
+            self._entries.clear()
+            self._scope_index.clear()
+            self.version = version
+
+    def _scope_matrix(self, scope: Tuple):
+        index = self._scope_index.get(scope)
+        if index is None:
+            ids = [entry_id for entry_id, entry in self._entries.items() if entry["scope"] == scope]
+            matrix = np.stack([self._entries[i]["embedding"] for i in ids]) if ids else None
+            index = (ids, matrix)
+            self._scope_index[scope] = index
+        return index
+
+    def lookup(self, embedding, scope: Tuple) -> Optional[Dict]:
+        query = self._normalize(embedding)
+        with self._lock:
+            ids, matrix = self._scope_matrix(scope)
+            if matrix is None:
+                self.misses += 1
+                return None
+
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            entry_id = ids[best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            entry = dict(self._entries[entry_id])
+            entry["id"] = entry_id
+            entry["similarity"] = float(similarities[best])
+            return entry
+
+    def store(self, embedding, scope: Tuple, query: str, retrieval_results: Dict) -> int:
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = {
+                "scope": scope,
+                "embedding": self._normalize(embedding),
+                "query": query,
+                "retrieval_results": dict(retrieval_results),
+                "answer_tokens": None,
+            }
+            self._scope_index.pop(scope, None)
+
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._scope_index.pop(evicted["scope"], None)
+
+            return entry_id
+
+    def set_answer(self, entry_id: int, answer_tokens: List[str]):
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is not None:
+                entry["answer_tokens"] = list(answer_tokens)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "version": self.version,
+        }
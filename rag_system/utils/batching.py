@@ -0,0 +1,133 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, List, Optional, Sequence
+
+
+class _Request:
+    __slots__ = ("items", "future")
+
+    def __init__(self, items: Sequence):
+        self.items = list(items)
+        self.future = Future()
+
+
+class MicroBatcher:
+    # Collects requests that arrive within max_wait_ms into a single call to `fn`.
+    # `fn` receives the concatenated items and must return one result per item.
+    # All calls run on the batcher's worker thread, so the model is never entered concurrently.
+
+    def __init__(self, fn: Callable[[List], Sequence], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, name: str = "micro-batcher"):
+        self.fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+
+        self.batches = 0
+        self.items = 0
+
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._carry: Optional[_Request] = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, items: Sequence) -> Future:
+        request = _Request(items)
+        if not request.items:
+            request.future.set_result([])
+            return request.future
+
+        self._ensure_worker()
+        self._queue.put(request)
+        return request.future
+
+    def __call__(self, items: Sequence) -> List:
+        return self.submit(items).result()
+
+    def _collect(self) -> List[_Request]:
+        # A request that would overflow max_batch_size waits for the next batch.
+        first, self._carry = (self._carry, None) if self._carry is not None else (self._queue.get(), None)
+        batch = [first]
+        size = len(first.items)
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if size + len(request.items) > self.max_batch_size:
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request.items)
+
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            flat = [item for request in batch for item in request.items]
+
+            try:
+                # Only a single request larger than max_batch_size is split here.
+                results = []
+                for start in range(0, len(flat), self.max_batch_size):
+                    results += list(self.fn(flat[start:start + self.max_batch_size]))
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(flat)
+
+            offset = 0
+            for request in batch:
+                n = len(request.items)
+                request.future.set_result(list(results[offset:offset + n]))
+                offset += n
+
+    def stats(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "pending": self._queue.qsize(),
+        }
+
+
+_SHARED_BATCHERS: Dict[Hashable, MicroBatcher] = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_batcher(key: Hashable, fn: Callable[[List], Sequence], max_batch_size: int = 32,
+                   max_wait_ms: float = 5.0, name: Optional[str] = None) -> MicroBatcher:
+    # One batcher per model, shared by every component that runs inference on it.
+    with _SHARED_LOCK:
+        batcher = _SHARED_BATCHERS.get(key)
+        if batcher is None:
+            # batcher_stats() is keyed by name, so names must not repeat.
+            name = name or "micro-batcher"
+            if any(other.name == name for other in _SHARED_BATCHERS.values()):
+                name = f"{name}-{len(_SHARED_BATCHERS)}"
+            batcher = MicroBatcher(fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, name=name)
+            _SHARED_BATCHERS[key] = batcher
+        return batcher
+
+
+def batcher_stats() -> Dict:
+    return {batcher.name: batcher.stats() for batcher in _SHARED_BATCHERS.values()}
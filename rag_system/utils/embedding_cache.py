@@ -0,0 +1,294 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag_system.utils.cache import LRUCache
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def model_identifier(model) -> str:
+    # The loaded checkpoint comes first: a fine-tuned model's card names its base model.
+    try:
+        name = model[0].auto_model.config._name_or_path
+    except Exception:
+        name = None
+    if not name:
+        card = getattr(model, "model_card_data", None)
+        name = getattr(card, "base_model", None) if card is not None else None
+    if not name:
+        # The class name alone would let two models share cache entries.
+        raise ValueError(
+            f"Cannot identify the {type(model).__name__} model for the embedding cache; pass model_id explicitly."
+        )
+    return name
+
+
+class MmapEmbeddingStore:
+    # Append-only matrix on disk (<prefix>.f32 or .f16) with one hex key per row (<prefix>.keys).
+    # With max_items set, the least recently used rows are dropped by rewriting the live rows
+    # into the next generation of files; <prefix>.json names the current generation, so a
+    # crash mid-compaction leaves the previous files in use.
+
+    def __init__(self, cache_dir: str, model_id: str, dtype: str = "float32", max_items: Optional[int] = None):
+        slug = re.sub(r"[^\w\-]+", "_", model_id).strip("_") or "model"
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported embedding cache dtype '{dtype}', expected float32 or float16.")
+        self.model_id = model_id
+        self.max_items = max_items
+        self.cache_dir = cache_dir
+        self.prefix = slug if self.dtype == np.float32 else f"{slug}.{self.dtype.name}"
+        self.meta_path = os.path.join(cache_dir, f"{self.prefix}.json")
+
+        self.dim: Optional[int] = None
+        self.generation = 0
+        self.rows: Dict[str, int] = {}
+        self.evictions = 0
+        self._last_used: Dict[str, int] = {}
+        self._tick = 0
+        self._matrix: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _paths(self, generation: int) -> Tuple[str, str]:
+        stem = self.prefix if generation == 0 else f"{self.prefix}.{generation}"
+        suffix = "f32" if self.dtype == np.float32 else "f16"
+        return os.path.join(self.cache_dir, f"{stem}.{suffix}"), os.path.join(self.cache_dir, f"{stem}.keys")
+
+    @property
+    def vectors_path(self) -> str:
+        return self._paths(self.generation)[0]
+
+    @property
+    def keys_path(self) -> str:
+        return self._paths(self.generation)[1]
+
+    def _write_meta(self):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump({"dim": self.dim, "model_id": self.model_id, "dtype": self.dtype.name,
+                       "generation": self.generation}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _load(self):
+        if not os.path.exists(self.meta_path):
+            return
+
+        with open(self.meta_path, "r", encoding="utf8") as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.generation = meta.get("generation", 0)
+
+        keys = []
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "r", encoding="utf8") as f:
+                keys = [line.strip() for line in f if line.strip()]
+
+        row_bytes = self.dtype.itemsize * self.dim
+        n_vectors = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+        # A crash between the two appends leaves extra keys or vectors; only complete rows count.
+        for row, key in enumerate(keys[:n_vectors]):
+            self.rows[key] = row
+            self._last_used[key] = row
+        self._tick = len(self.rows)
+
+    def _mapped(self) -> Optional[np.memmap]:
+        n_rows = max(self.rows.values()) + 1 if self.rows else 0
+        if n_rows == 0:
+            return None
+        if self._matrix is None or self._matrix.shape[0] < n_rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(n_rows, self.dim))
+        return self._matrix
+
+    def _touch(self, key: str):
+        self._tick += 1
+        self._last_used[key] = self._tick
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self.rows.get(key)
+            if row is None:
+                return None
+            self._touch(key)
+            return np.asarray(self._mapped()[row], dtype=np.float32)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        # One sorted gather from the memmap instead of a lookup per key.
+        with self._lock:
+            found = sorted({key for key in keys if key in self.rows}, key=self.rows.get)
+            if not found:
+                return {}
+            for key in found:
+                self._touch(key)
+            vectors = np.asarray(self._mapped()[[self.rows[key] for key in found]], dtype=np.float32)
+        return dict(zip(found, vectors))
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._write_meta()
+
+            fresh = {}
+            for key, vec in zip(keys, vectors):
+                if key not in self.rows and key not in fresh:
+                    fresh[key] = vec
+            if not fresh:
+                return
+
+            start = max(self.rows.values()) + 1 if self.rows else 0
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(np.stack(list(fresh.values())), dtype=self.dtype).tobytes())
+            with open(self.keys_path, "a", encoding="utf8") as f:
+                f.write("".join(f"{key}\n" for key in fresh))
+
+            for offset, key in enumerate(fresh):
+                self.rows[key] = start + offset
+                self._touch(key)
+            self._matrix = None
+
+            if self.max_items and len(self.rows) > self.max_items:
+                self._compact()
+
+    def _compact(self):
+        # Keeps the most recently used 90% of max_items, so compaction is not rerun on every put.
+        keep = max(1, int(self.max_items * 0.9))
+        survivors = sorted(self.rows, key=self._last_used.get, reverse=True)[:keep]
+        survivors.sort(key=self.rows.get)
+
+        matrix = self._mapped()
+        old_paths = self._paths(self.generation)
+        vectors_path, keys_path = self._paths(self.generation + 1)
+        with open(vectors_path, "wb") as f:
+            for start in range(0, len(survivors), 65536):
+                rows = [self.rows[key] for key in survivors[start:start + 65536]]
+                f.write(np.ascontiguousarray(matrix[rows]).tobytes())
+        with open(keys_path, "w", encoding="utf8") as f:
+            f.write("".join(f"{key}\n" for key in survivors))
+
+        self._matrix = None
+        self.generation += 1
+        self._write_meta()
+        for path in old_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+        self.evictions += len(self.rows) - len(survivors)
+        self.rows = {key: row for row, key in enumerate(survivors)}
+        self._last_used = {key: self._last_used[key] for key in survivors}
+
+
+class EmbeddingCache:
+    # Content-addressed: entries are keyed by (model id, hash of the normalized text), so the
+    # same text is encoded once per model no matter which query, chunking run or file it
+    # came from. Disk rows can be stored as float16 and bounded by max_disk_items.
+
+    def __init__(self, cache_dir: Optional[str] = None, max_memory_items: int = 2048, dtype: str = "float32",
+                 max_disk_items: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.dtype = dtype
+        self.max_disk_items = max_disk_items
+        self.memory = LRUCache(max_size=max_memory_items)
+        self.disk_hits = 0
+        self._stores: Dict[str, MmapEmbeddingStore] = {}
+        self._lock = threading.Lock()
+
+    def _store(self, model_id: str) -> Optional[MmapEmbeddingStore]:
+        if not self.cache_dir:
+            return None
+        with self._lock:
+            if model_id not in self._stores:
+                self._stores[model_id] = MmapEmbeddingStore(
+                    self.cache_dir, model_id, dtype=self.dtype, max_items=self.max_disk_items
+                )
+            return self._stores[model_id]
+
+    def get(self, model_id: str, key: str) -> Optional[np.ndarray]:
+        vector = self.memory.get((model_id, key))
+        if vector is not None:
+            return vector
+
+        store = self._store(model_id)
+        vector = store.get(key) if store is not None else None
+        if vector is not None:
+            self.disk_hits += 1
+            self.memory.put((model_id, key), vector)
+        return vector
+
+    def put_many(self, model_id: str, keys: Sequence[str], vectors: np.ndarray):
+        for key, vector in zip(keys, vectors):
+            self.memory.put((model_id, key), vector)
+
+        store = self._store(model_id)
+        if store is not None:
+            store.put_many(keys, vectors)
+
+    def encode(self, model, texts: Sequence[str], model_id: Optional[str] = None,
+               encode_fn: Optional[Callable[[List[str]], Sequence]] = None) -> np.ndarray:
+        model_id = model_id or model_identifier(model)
+        keys = [text_key(text) for text in texts]
+
+        vectors: List[Optional[np.ndarray]] = [self.memory.get((model_id, key)) for key in keys]
+        store = self._store(model_id)
+        if store is not None and any(vector is None for vector in vectors):
+            from_disk = store.get_many([key for key, vector in zip(keys, vectors) if vector is None])
+            self.disk_hits += len(from_disk)
+            for key, vector in from_disk.items():
+                self.memory.put((model_id, key), vector)
+            vectors = [from_disk.get(key) if vector is None else vector for key, vector in zip(keys, vectors)]
+
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], []).append(i)
+
+        if missing:
+            miss_texts = [texts[positions[0]] for positions in missing.values()]
+            if encode_fn is not None:
+                encoded = np.asarray(encode_fn(miss_texts), dtype=np.float32)
+            else:
+                encoded = np.asarray(model.encode(miss_texts, convert_to_numpy=True), dtype=np.float32)
+
+            self.put_many(model_id, list(missing), encoded)
+            for positions, vector in zip(missing.values(), encoded):
+                for i in positions:
+                    vectors[i] = vector
+
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack(vectors)
+
+    def stats(self) -> Dict:
+        stats = self.memory.stats()
+        stats["disk_hits"] = self.disk_hits
+        stats["disk_items"] = {model_id: len(store) for model_id, store in self._stores.items()}
+        stats["disk_evictions"] = sum(store.evictions for store in self._stores.values())
+        return stats
+
+
+def encode_chunks(model, chunks: Sequence[str], embedding_cache: Optional[EmbeddingCache] = None):
+    # Chunkers return tensors; with a cache only texts it has not seen reach the model.
+    import torch
+
+    if embedding_cache is None:
+        return model.encode(list(chunks), convert_to_tensor=True)
+    return torch.from_numpy(embedding_cache.encode(model, list(chunks)))
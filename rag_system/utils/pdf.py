@@ -10,12 +10,9 @@ def extract_pdf(path_pdf: Path):
     TextPreprocessorInstance = TextPreprocessor()
     
     doc = pymupdf.open(path_pdf.with_suffix(".pdf"))
-    full_text = ""
+    pages = [page.get_text() for page in doc]
 
-    for page in doc:
-        full_text += page.get_text() + "\n"
-
-    full_text = TextPreprocessorInstance.run(full_text)
+    full_text = TextPreprocessorInstance.run_pages(pages)
 
     with open("output.txt", "w", encoding="utf8") as out:
         out.write(full_text)
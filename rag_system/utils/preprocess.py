@@ -1,10 +1,32 @@
 import re
-from typing import Callable, List
+import time
+from collections import Counter
+from typing import Callable, Dict, List
 from difflib import SequenceMatcher
 
+_DIGITS = re.compile(r"\d+")
+
 
 class TextPreprocessor:
-    def __init__(self, steps: List[Callable] = None):
+    # exact_scope="page" only drops exact duplicate lines within the same page (needs run_pages);
+    # "document" is the original behaviour. header_footer=True removes lines that repeat in the
+    # first/last header_footer_lines lines of at least header_footer_min_fraction of the pages
+    # (page numbers are ignored when comparing), before any other step.
+
+    def __init__(
+        self,
+        steps: List[Callable] = None,
+        fast_fuzzy: bool = True,
+        exact_scope: str = "document",
+        header_footer: bool = False,
+        header_footer_lines: int = 3,
+        header_footer_min_fraction: float = 0.5,
+        header_footer_min_pages: int = 3,
+        report: bool = False
+    ):
+        if exact_scope not in ("document", "page"):
+            raise ValueError(f"Unknown exact_scope '{exact_scope}', expected 'document' or 'page'.")
+
         if steps is None:
             steps = [
                 self.clean_spaces,
@@ -13,6 +35,14 @@ class TextPreprocessor:
                 self.collapse_empty_lines,
             ]
         self.steps = steps
+        self.fast_fuzzy = fast_fuzzy
+        self.exact_scope = exact_scope
+        self.header_footer = header_footer
+        self.header_footer_lines = header_footer_lines
+        self.header_footer_min_fraction = header_footer_min_fraction
+        self.header_footer_min_pages = header_footer_min_pages
+        self.report = report
+        self.last_stats: Dict = {}
 
     def clean_spaces(self, text: str) -> str:
         return re.sub(r"[^\S\r\n]+", " ", text)
@@ -37,17 +67,39 @@ class TextPreprocessor:
             return False
         return SequenceMatcher(None, a, b).ratio() >= threshold
 
+    @staticmethod
+    def _fast_similar(matcher: SequenceMatcher, a: str, b: str, threshold: float = 0.88) -> bool:
+        # Same answer as is_similar: the length bound and quick_ratio are upper bounds of
+        # ratio(), so the full comparison only runs for pairs that could pass. matcher has
+        # b set as seq2 and is reused while the previous kept line does not change.
+        if not a or not b:
+            return False
+        if a == b:
+            return True
+        if 2.0 * min(len(a), len(b)) / (len(a) + len(b)) < threshold:
+            return False
+        matcher.set_seq1(a)
+        return matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold
+
     def remove_fuzzy_duplicates(self, text: str) -> str:
         lines = text.split("\n")
         cleaned = []
+        matcher, matcher_line = SequenceMatcher(None), None
 
         for line in lines:
             ls = line.strip()
 
             if cleaned:
                 last = cleaned[-1].strip()
-                if self.is_similar(ls, last):
-                    continue 
+                if self.fast_fuzzy:
+                    if matcher_line is not cleaned[-1]:
+                        matcher.set_seq2(last)
+                        matcher_line = cleaned[-1]
+                    similar = self._fast_similar(matcher, ls, last)
+                else:
+                    similar = self.is_similar(ls, last)
+                if similar:
+                    continue
 
             cleaned.append(line)
 
@@ -56,7 +108,65 @@ class TextPreprocessor:
     def collapse_empty_lines(self, text: str) -> str:
         return re.sub(r"\n\s*\n+", "\n\n", text)
 
-    def run(self, text: str) -> str:
-        for step in self.steps:
+    @staticmethod
+    def _furniture_key(line: str) -> str:
+        return _DIGITS.sub("#", " ".join(line.lower().split()))
+
+    def remove_headers_footers(self, pages: List[str]) -> List[str]:
+        edges = []
+        for page in pages:
+            positions = [i for i, line in enumerate(page.split("\n")) if line.strip()]
+            # Short pages keep their body: at most a quarter of the lines count as edges.
+            k = min(self.header_footer_lines, len(positions) // 4)
+            edges.append(set(positions[:k] + positions[-k:]) if k else set())
+
+        counts = Counter()
+        page_lines = [page.split("\n") for page in pages]
+        for lines, positions in zip(page_lines, edges):
+            counts.update({self._furniture_key(lines[i]) for i in positions})
+
+        min_pages = max(self.header_footer_min_pages, self.header_footer_min_fraction * len(pages))
+        furniture = {key for key, count in counts.items() if count >= min_pages}
+        if not furniture:
+            return pages
+
+        return [
+            "\n".join(
+                line for i, line in enumerate(lines)
+                if i not in positions or self._furniture_key(line) not in furniture
+            )
+            for lines, positions in zip(page_lines, edges)
+        ]
+
+    def _apply(self, text: str, steps: List[Callable], n_lines: int, started: float) -> str:
+        for step in steps:
             text = step(text)
+
+        elapsed = time.perf_counter() - started
+        self.last_stats = {
+            "lines": n_lines,
+            "seconds": elapsed,
+            "lines_per_second": n_lines / elapsed if elapsed else 0.0
+        }
+        if self.report:
+            print(f"[preprocess] {n_lines} linhas em {elapsed:.2f}s ({self.last_stats['lines_per_second']:.0f} linhas/s)")
         return text.strip()
+
+    def run(self, text: str) -> str:
+        return self._apply(text, self.steps, text.count("\n") + 1, time.perf_counter())
+
+    def run_pages(self, pages: List[str]) -> str:
+        # Page-aware variant of run(): header/footer removal and page-scoped exact
+        # deduplication see page boundaries, the remaining steps run on the joined text.
+        started = time.perf_counter()
+        n_lines = sum(page.count("\n") + 1 for page in pages)
+
+        if self.header_footer:
+            pages = self.remove_headers_footers(pages)
+
+        steps = self.steps
+        if self.exact_scope == "page":
+            pages = [self.remove_exact_duplicates(self.clean_spaces(page)) for page in pages]
+            steps = [step for step in steps if step != self.remove_exact_duplicates]
+
+        return self._apply("\n".join(pages), steps, n_lines, started)
@@ -0,0 +1,52 @@
+import itertools
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str):
+    import tiktoken
+
+    return tiktoken.get_encoding(name)
+
+
+def chunk_length_metadata(chunks: List[str], encoding_name: str = "cl100k_base") -> List[Dict]:
+    # Computed once at ingestion and stored with each chunk, so context budgeting at query
+    # time does not need to re-tokenize.
+    token_lists = get_encoding(encoding_name).encode_ordinary_batch(list(chunks))
+    return [
+        {
+            "token_count": len(tokens),
+            "token_encoding": encoding_name,
+            "word_count": len(chunk.split())
+        }
+        for chunk, tokens in zip(chunks, token_lists)
+    ]
+
+
+def tokenizer_name(tokenizer) -> Optional[str]:
+    # tiktoken encodings expose .name, Hugging Face tokenizers .name_or_path.
+    return getattr(tokenizer, "name", None) or getattr(tokenizer, "name_or_path", None)
+
+
+def document_length(doc: Dict, tokenizer=None) -> int:
+    # Stored counts when they were made for this tokenizer, otherwise counted on the fly
+    # (chunks ingested before counts were stored).
+    if tokenizer is None:
+        count = doc.get("word_count")
+        return count if count is not None else len(doc["text"].split())
+
+    if doc.get("token_count") is not None and doc.get("token_encoding") == tokenizer_name(tokenizer):
+        return doc["token_count"]
+    return len(tokenizer.encode(doc["text"]))
+
+
+def fit_to_budget(documents: Iterable[Dict], max_tokens: int, tokenizer=None) -> List[Dict]:
+    # Longest prefix of `documents` whose running length stays within max_tokens.
+    documents = list(documents)
+    kept = 0
+    for total in itertools.accumulate(document_length(doc, tokenizer) for doc in documents):
+        if total > max_tokens:
+            break
+        kept += 1
+    return documents[:kept]
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from rag_system.VectorDB.exact import ExactCollection
+
+
+def _vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"quantization": "int8", "train_size": 2},
+    {"prefix_dims": 8},
+])
+def test_rows_written_after_last_flush_are_dropped_on_reopen(tmp_path, params):
+    path = str(tmp_path / "collection")
+    vectors = _vectors(4)
+
+    collection = ExactCollection(path, **params)
+    collection.upsert(ids=["a", "b"], embeddings=vectors[:2], documents=["a", "b"])
+
+    # Crash between the vector appends and the table flush: vectors on disk, no table rows.
+    collection._add_vectors(np.array([2]), vectors[2:3])
+
+    collection = ExactCollection(path, **params)
+    assert len(collection.matrix) == 2
+    for matrix in (collection.codes, collection.prefix):
+        if matrix is not None:
+            assert len(matrix) == 2
+
+    collection.upsert(ids=["c"], embeddings=vectors[3:4], documents=["c"])
+    for reopened in (collection, ExactCollection(path, **params)):
+        result = reopened.query(query_embeddings=vectors[3:4], n_results=1)
+        assert result["ids"][0] == ["c"]
+        assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-5)
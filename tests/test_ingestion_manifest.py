@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+pytest.importorskip("ollama")
+pytest.importorskip("pymupdf")
+
+from rag_system.ingestion import IngestionManifest
+
+
+def _write(path, text):
+    with open(path, "w", encoding="utf8") as f:
+        f.write(text)
+    return str(path)
+
+
+def _ingest(manifest, path, ids):
+    status, file_hash, stale_ids = manifest.check(path)
+    assert status == "new"
+    manifest.record(path, file_hash, ids)
+    return file_hash, stale_ids
+
+
+def test_unchanged_file_is_skipped_after_reopen(tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    a = _write(tmp_path / "a.pdf", "alpha")
+
+    manifest = IngestionManifest(manifest_path)
+    file_hash, stale_ids = _ingest(manifest, a, ["a_0", "a_1"])
+    assert stale_ids == []
+    manifest.save()
+
+    assert IngestionManifest(manifest_path).check(a) == ("unchanged", file_hash, [])
+
+
+def test_touched_but_identical_file_is_unchanged(tmp_path):
+    manifest = IngestionManifest()
+    a = _write(tmp_path / "a.pdf", "alpha")
+    file_hash, _ = _ingest(manifest, a, ["a_0"])
+
+    stat = os.stat(a)
+    os.utime(a, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert manifest.check(a) == ("unchanged", file_hash, [])
+    assert manifest.files["a.pdf"]["mtime_ns"] == stat.st_mtime_ns + 10 ** 9
+
+
+def test_renamed_copy_is_a_duplicate_without_stale_ids(tmp_path):
+    manifest = IngestionManifest()
+    a = _write(tmp_path / "a.pdf", "alpha")
+    b = _write(tmp_path / "b.pdf", "alpha")
+    file_hash, _ = _ingest(manifest, a, ["a_0"])
+
+    assert manifest.check(b) == ("duplicate", file_hash, [])
+    assert manifest.files["b.pdf"]["file_hash"] == file_hash
+
+
+def test_replaced_file_returns_the_previous_ids(tmp_path):
+    manifest = IngestionManifest()
+    a = _write(tmp_path / "a.pdf", "alpha")
+    old_hash, _ = _ingest(manifest, a, ["a_0", "a_1"])
+
+    _write(a, "alpha, second edition")
+    status, new_hash, stale_ids = manifest.check(a)
+    assert (status, stale_ids) == ("new", ["a_0", "a_1"])
+    assert new_hash != old_hash
+
+    manifest.record(a, new_hash, ["a_2"])
+    assert old_hash not in manifest.documents
+    assert manifest.documents[new_hash] == {"source": "a.pdf", "ids": ["a_2"]}
+
+
+def test_file_replaced_by_already_ingested_content(tmp_path):
+    manifest = IngestionManifest()
+    a = _write(tmp_path / "a.pdf", "alpha")
+    b = _write(tmp_path / "b.pdf", "beta")
+    old_hash, _ = _ingest(manifest, a, ["a_0"])
+    b_hash, _ = _ingest(manifest, b, ["b_0"])
+
+    _write(a, "beta")
+    assert manifest.check(a) == ("duplicate", b_hash, ["a_0"])
+    assert old_hash not in manifest.documents
+
+
+def test_previous_version_still_held_by_another_file_is_not_stale(tmp_path):
+    manifest = IngestionManifest()
+    a = _write(tmp_path / "a.pdf", "alpha")
+    b = _write(tmp_path / "b.pdf", "alpha")
+    _ingest(manifest, a, ["a_0"])
+    assert manifest.check(b)[0] == "duplicate"
+
+    _write(a, "alpha, second edition")
+    status, _, stale_ids = manifest.check(a)
+    assert (status, stale_ids) == ("new", [])
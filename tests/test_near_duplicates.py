@@ -0,0 +1,129 @@
+import random
+
+from rag_system.chunking.near_duplicates import NearDuplicateIndex
+
+VOCAB = [f"palavra{i}" for i in range(500)]
+
+
+def _paragraph(seed, n_words=120):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(VOCAB) for _ in range(n_words))
+
+
+def _near(text):
+    words = text.split()
+    words[5] = "alterada"
+    return " ".join(words)
+
+
+def _source(name):
+    return {"source": name, "file_hash": f"hash-{name}", "page": 1, "pdf_name": name}
+
+
+def test_near_duplicate_is_assigned_to_the_first_chunk():
+    index = NearDuplicateIndex()
+    text = _paragraph(0)
+
+    assert index.assign("a_0", text, _source("a.pdf")) is None
+    assert index.assign("b_0", _near(text), _source("b.pdf")) == "a_0"
+    assert index.assign("c_0", _paragraph(1), _source("c.pdf")) is None
+
+    assert index.alias_of == {"a_0": "a_0", "b_0": "a_0", "c_0": "c_0"}
+    assert [entry["source"] for entry in index.sources("b_0")] == ["a.pdf", "b.pdf"]
+    assert index.stats() == {"canonical_chunks": 2, "aliases": 1, "duplicates_found": 1}
+
+
+def test_assign_is_idempotent_and_skips_empty_text():
+    index = NearDuplicateIndex()
+    text = _paragraph(0)
+    index.assign("a_0", text, _source("a.pdf"))
+    index.assign("b_0", text, _source("b.pdf"))
+
+    assert index.assign("b_0", text, _source("b.pdf")) == "a_0"
+    assert index.assign("a_0", text, _source("a.pdf")) is None
+    assert index.assign("e_0", "   ", _source("e.pdf")) is None
+    assert "e_0" not in index.alias_of
+    assert index.stats()["aliases"] == 1
+
+
+def test_excluded_canonicals_are_not_matched():
+    index = NearDuplicateIndex()
+    text = _paragraph(0)
+    index.assign("a_0", text, _source("a.pdf"))
+
+    assert index.assign("a2_0", _near(text), _source("a.pdf"), exclude={"a_0"}) is None
+    assert index.match(index.signature(text), exclude={"a_0", "a2_0"}) is None
+
+
+def test_release_keeps_a_canonical_other_sources_still_contain():
+    index = NearDuplicateIndex()
+    text = _paragraph(0)
+    index.assign("a_0", text, _source("a.pdf"))
+    index.assign("b_0", _near(text), _source("b.pdf"))
+    index.assign("c_0", _near(text), _source("c.pdf"))
+
+    released = index.release(["a_0"])
+    assert list(released["kept"]) == ["a_0"]
+    assert released["kept"]["a_0"]["source"] == "b.pdf"
+    assert released["renamed"] == {} and released["dropped"] == [] and released["changed"] == []
+    assert [entry["source"] for entry in index.sources("a_0")] == ["b.pdf", "c.pdf"]
+
+    # Once every copy is gone the canonical chunk goes too.
+    released = index.release(["b_0", "c_0"])
+    assert released["dropped"] == ["a_0"]
+    assert len(index) == 0 and index.alias_of == {}
+    assert index.assign("d_0", _near(text), _source("d.pdf")) is None
+
+
+def test_release_of_an_alias_reports_the_changed_canonical():
+    index = NearDuplicateIndex()
+    text = _paragraph(0)
+    index.assign("a_0", text, _source("a.pdf"))
+    index.assign("b_0", _near(text), _source("b.pdf"))
+
+    released = index.release(["b_0"])
+    assert released["changed"] == ["a_0"]
+    assert index.stats()["aliases"] == 0
+
+
+def test_release_with_rekey_hands_the_canonical_role_to_a_copy():
+    index = NearDuplicateIndex(mode="flag")
+    text = _paragraph(0)
+    index.assign("a_0", text, _source("a.pdf"))
+    index.assign("b_0", _near(text), _source("b.pdf"))
+    index.assign("c_0", _near(text), _source("c.pdf"))
+
+    released = index.release(["a_0"], rekey=True)
+    assert released["renamed"] == {"a_0": "b_0"}
+    assert released["kept"] == {}
+    assert "a_0" not in index.signatures and "b_0" in index.signatures
+    assert index.alias_of == {"b_0": "b_0", "c_0": "b_0"}
+    assert index.assign("d_0", _near(text), _source("d.pdf")) == "b_0"
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "near_duplicates.pkl")
+    text = _paragraph(0)
+
+    index = NearDuplicateIndex(path)
+    index.assign("a_0", text, _source("a.pdf"))
+    index.assign("b_0", _near(text), _source("b.pdf"))
+    index.assign("c_0", _paragraph(1), _source("c.pdf"))
+    index.save()
+
+    reloaded = NearDuplicateIndex(path)
+    assert reloaded.alias_of == index.alias_of
+    assert reloaded.provenance == index.provenance
+    assert set(reloaded.signatures) == {"a_0", "c_0"}
+    assert reloaded.assign("d_0", _near(text), _source("d.pdf")) == "a_0"
+
+
+def test_index_saved_with_other_parameters_starts_empty(tmp_path, capsys):
+    path = str(tmp_path / "near_duplicates.pkl")
+    index = NearDuplicateIndex(path)
+    index.assign("a_0", _paragraph(0), _source("a.pdf"))
+    index.save()
+
+    reloaded = NearDuplicateIndex(path, num_perm=64, bands=16)
+    assert len(reloaded) == 0 and reloaded.alias_of == {}
+    assert "[WARN]" in capsys.readouterr().out
@@ -0,0 +1,97 @@
+import random
+from difflib import SequenceMatcher
+
+import pytest
+
+from rag_system.utils.preprocess import TextPreprocessor
+
+WORDS = "modelo dados resultado rede treinamento análise método proposto avaliação tabela figura".split()
+
+
+def _line(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 25)))
+
+
+def _variant(rng, line):
+    # Near-duplicates as OCR produces them: a few characters dropped, replaced or appended.
+    chars = list(line)
+    for _ in range(rng.randint(0, 4)):
+        if not chars:
+            break
+        i = rng.randrange(len(chars))
+        edit = rng.choice(("drop", "replace", "append"))
+        if edit == "drop":
+            del chars[i]
+        elif edit == "replace":
+            chars[i] = rng.choice("abcxyz .")
+        else:
+            chars.append(rng.choice("abc."))
+    return "".join(chars)
+
+
+def _fuzzed_document(rng, n_lines=60):
+    lines = []
+    for _ in range(n_lines):
+        line = _line(rng) if not lines or rng.random() < 0.6 else _variant(rng, lines[-1])
+        lines.append(("  " if rng.random() < 0.1 else "") + line)
+    return "\n".join(lines)
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_fast_fuzzy_matches_sequence_matcher(seed):
+    text = _fuzzed_document(random.Random(seed))
+    assert TextPreprocessor(fast_fuzzy=True).run(text) == TextPreprocessor(fast_fuzzy=False).run(text)
+
+
+def test_fast_similar_agrees_with_is_similar():
+    rng = random.Random(0)
+    matcher = SequenceMatcher(None)
+    for _ in range(2000):
+        a = _line(rng)
+        b = _variant(rng, a) if rng.random() < 0.7 else _line(rng)
+        matcher.set_seq2(b)
+        assert TextPreprocessor._fast_similar(matcher, a, b) == TextPreprocessor.is_similar(a, b)
+
+
+def _pages(n_pages=6):
+    rng = random.Random(0)
+    pages = []
+    for number in range(1, n_pages + 1):
+        body = [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(12)]
+        body.insert(5, "Tabela 1")
+        pages.append("\n".join(
+            ["UNIVERSIDADE FEDERAL DE VIÇOSA", "Capítulo 3. Metodologia"] + body + ["", f"Página {number}"]
+        ))
+    return pages
+
+
+def test_headers_and_footers_are_removed_from_every_page():
+    original = _pages()
+    pages = TextPreprocessor(header_footer=True).remove_headers_footers(original)
+
+    for number, (page, before) in enumerate(zip(pages, original), start=1):
+        assert "UNIVERSIDADE FEDERAL DE VIÇOSA" not in page
+        assert "Capítulo 3. Metodologia" not in page
+        assert f"Página {number}" not in page
+        # Only the furniture goes: "Tabela 1" repeats on every page too, but in the body.
+        assert page.split("\n") == before.split("\n")[2:-1]
+
+
+def test_header_footer_removal_needs_enough_pages():
+    pages = _pages(n_pages=2)
+    assert TextPreprocessor(header_footer=True, header_footer_min_pages=3).remove_headers_footers(pages) == pages
+
+
+def test_short_pages_keep_their_body():
+    pages = ["Resumo\nCurto", "Resumo\nCurto", "Resumo\nCurto"]
+    assert TextPreprocessor(header_footer=True).remove_headers_footers(pages) == pages
+
+
+def test_page_scope_keeps_lines_repeated_on_other_pages():
+    pages = ["Tabela 1\nvalores da primeira tabela", "Tabela 1\nvalores da segunda tabela"]
+
+    by_page = TextPreprocessor(exact_scope="page").run_pages(pages)
+    by_document = TextPreprocessor().run_pages(pages)
+
+    assert by_page.count("Tabela 1") == 2
+    assert by_document.count("Tabela 1") == 1